@@ -3,18 +3,12 @@ import dash
 from dash import html
 from flask import Flask
 from constants import SPARQL_ENDPOINT
+from helpers import site_frames
 import sys
 
 FA = "https://use.fontawesome.com/releases/v5.8.1/css/all.css"
 
-server = Flask(__name__)  # define flask app.server
-
-app = dash.Dash(
-    url_base_pathname="/dashboard/",
-    external_stylesheets=[dbc.themes.LITERA, FA], use_pages=True, server=server
-)
-
-app.index_string = """
+INDEX_STRING = """
 <!DOCTYPE html>
 <html>
     <head>
@@ -34,22 +28,46 @@ app.index_string = """
 </html>
 """
 
-app.layout = html.Div(
-    style={"display": "flex", "flexDirection": "column", "minHeight": "100vh"},
-    children=[
-        html.Div(
-            dash.page_container,
-            style={
-                "flex": "1 0 auto",  # Ensure it takes the remaining space but can grow
-                "margin-bottom": "40px",
-            },
-        ),
-    ],
-)
-
-app.config.suppress_callback_exceptions = True
+
+def create_app():
+    """Builds the Dash app and its Flask server, loading every page"""
+    server = Flask(__name__)  # define flask app.server
+
+    # Reload persisted site frames before the pages load their data
+    site_frames.warm_start()
+
+    app = dash.Dash(
+        url_base_pathname="/dashboard/",
+        external_stylesheets=[dbc.themes.LITERA, FA],
+        use_pages=True,
+        server=server,
+    )
+
+    app.index_string = INDEX_STRING
+
+    app.layout = html.Div(
+        style={"display": "flex", "flexDirection": "column", "minHeight": "100vh"},
+        children=[
+            html.Div(
+                dash.page_container,
+                style={
+                    "flex": "1 0 auto",  # Ensure it takes the remaining space but can grow
+                    "margin-bottom": "40px",
+                },
+            ),
+        ],
+    )
+
+    app.config.suppress_callback_exceptions = True
+
+    return app
+
+
+# Process pool workers import the script that started the server again, as
+# __mp_main__. Their tasks only need helpers, so they must not load the pages
+if __name__ != "__mp_main__":
+    app = create_app()
 
 # Run app and display result inline in the notebook
 if __name__ == "__main__":
     app.run_server(host="0.0.0.0", port=8050)
-    
\ No newline at end of file
@@ -1,4 +1,8 @@
-from components.cards.gt_model import get_gt_model
+from components.cards.gt_model import (
+    get_gt_model,
+    get_gt_model_patch,
+    point_uris,
+)
 from components.cards.kpi import stats_card
 from components.cards.pie import pie_card
-from components.cards.geo_map import geo_model_card
+from components.cards.geo_map import geo_model_card, map_style_patch, plotted_sites
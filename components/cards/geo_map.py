@@ -1,5 +1,6 @@
 import dash
-from dash import dcc, html
+import numpy as np
+from dash import Patch, dcc, html
 import plotly.express as px
 import geopandas as gpd
 from shapely.wkt import loads
@@ -16,14 +17,67 @@ def safe_wkt_load(wkt_str):
         return None
 
 
-def get_geo_model(gm, theme):
-    """a function to get a scatter mapbox plot"""
+def map_style(theme):
+    """
+    Base map of a theme: OpenStreetMap when light, USGS imagery when dark.
 
-    # check if invalid invalid_geo_df = gdf[~gdf["lat"].between(-90, 90) | ~gdf["lon"].between(-180, 180)]
-    gm.df = gm.df[(gm.df["lat"].between(-90, 90)) & (gm.df["lon"].between(-180, 180))]
+    :param theme: str - "light" or "dark"
+    :return: dict - style and layers of the mapbox layout
+    """
+    if theme == "light":
+        return dict(style="open-street-map", layers=[])
+    return dict(
+        style="white-bg",
+        layers=[
+            {
+                "below": "traces",
+                "sourcetype": "raster",
+                "sourceattribution": "United States Geological Survey",
+                "source": [
+                    "https://basemap.nationalmap.gov/arcgis/rest/services/USGSImageryOnly/MapServer/tile/{z}/{y}/{x}"
+                ],
+            }
+        ],
+    )
+
+
+def map_style_patch(theme):
+    """
+    Partial update switching the base map of a rendered geo plot. The site
+    points, and the zoom and center the user is at, stay in the browser.
+
+    :param theme: str - "light" or "dark"
+    :return: dash.Patch - Update of the figure property of the plot
+    """
+    patched = Patch()
+    for key, value in map_style(theme).items():
+        patched["layout"]["mapbox"][key] = value
+    return patched
+
+
+def plotted_sites(df):
+    """
+    Returns the sites with valid coordinates, in the order they are plotted.
+
+    :param df: pd.DataFrame - Sites of a GeoMineral model
+    :return: pd.DataFrame - The plotted sites, the position of a site is its id
+    """
+    return df[(df["lat"].between(-90, 90)) & (df["lon"].between(-180, 180))]
+
+
+def get_geo_model(gm, theme, sites=None):
+    """
+    a function to get a scatter mapbox plot
+
+    :param gm: GeoMineral - Model to plot
+    :param theme: str - light or dark
+    :param sites: pd.DataFrame - plotted_sites of the model, computed if None
+    """
+    if sites is None:
+        sites = plotted_sites(gm.df)
 
     geo_model = px.scatter_mapbox(
-        gm.df,
+        sites,
         lat="lat",
         lon="lon",
         hover_name="ms_name",
@@ -42,39 +96,27 @@ def get_geo_model(gm, theme):
         )
     )
 
-    # Set the hovertext to be the "ms_name"
-    geo_model.update_traces(hovertext=gm.df["ms_name"])
+    # Set the hovertext to be the "ms_name", and the row of each point in sites
+    # as its id for the click callback
+    geo_model.update_traces(
+        hovertext=sites["ms_name"], customdata=np.arange(len(sites))
+    )
 
     # Setting Map Style and toggle based on theme
-    if theme == "light":
-        geo_model.update_layout(mapbox_style="open-street-map")
-    else:
-        geo_model.update_layout(
-            mapbox_style="white-bg",
-            mapbox_layers=[
-                {
-                    "below": "traces",
-                    "sourcetype": "raster",
-                    "sourceattribution": "United States Geological Survey",
-                    "source": [
-                        "https://basemap.nationalmap.gov/arcgis/rest/services/USGSImageryOnly/MapServer/tile/{z}/{y}/{x}"
-                    ],
-                }
-            ],
-        )
+    geo_model.update_layout(mapbox=map_style(theme))
     geo_model.update_layout(margin={"r": 0, "t": 50, "l": 0, "b": 10})
 
     return geo_model
 
 
-def geo_model_card(geo_min, theme):
+def geo_model_card(geo_min, theme, sites=None):
     """a function to get return scatter mapbox plot in a dbc.Card"""
     return dbc.Card(
         dbc.CardBody(
             [
                 dcc.Graph(
                     id="clickable-geo-plot",
-                    figure=get_geo_model(geo_min, theme),
+                    figure=get_geo_model(geo_min, theme, sites),
                     config={
                         "displayModeBar": True,
                         "displaylogo": False,
@@ -1,11 +1,27 @@
+from functools import lru_cache
+
 import pandas as pd
 import numpy as np
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
-from dash import dcc
+from dash import Patch, dcc
 
-import numpy as np
-import plotly.graph_objects as go
+from constants import GT_WEBGL_MIN_POINTS
+
+# Constant contained metal lines drawn behind the sites, in million tonnes
+ISO_METAL_CONTENTS = np.logspace(-9, 10, num=20)
+ISO_TONNAGE_RANGE = np.logspace(-8, 8, 100)
+
+HOVER_TEMPLATE = (
+    "<b>MS Name:</b> %{text}<br>"
+    + "<b>Commodity:</b> %{customdata[0]}<br>"
+    + "<b>Grade:</b> %{y}<br>"
+    + "<b>Tonnage:</b> %{x}<br>"
+    + "<extra></extra>"
+)
+
+# Trace properties that change with the proximity value
+PATCHED_KEYS = ("type", "x", "y", "text", "customdata")
 
 
 def extract_lat_lon(wkt_point):
@@ -24,83 +40,115 @@ def calculate_min_max_distance(distances):
     return min_distance, max_distance
 
 
-def greedy_weighted_avg_aggregation(df, distances, proximity_threshold):
-    # Create an empty list to store aggregated data
-    aggregated_data = []
-    processed_indices = set()
-
-    # Loop through all points
-    for i in range(len(df)):
-        if i in processed_indices:
-            continue  # Skip already processed points
-
-        # Start with the current point as the center
-        group = [i]
-        processed_indices.add(i)
-
-        # Find all nearby points within the proximity threshold
-        for j in range(len(df)):
-            if i != j and j not in processed_indices:
-                # Ensure that the distance is valid and is not None
-                distance = distances.get((i, j))
-                if distance is not None and distance < proximity_threshold:
-                    group.append(j)
-                    processed_indices.add(j)
-
-        # Calculate the weighted average of the grade using tonnage as weights
-        total_tonnage = df.iloc[group]["total_tonnage"].sum()
-        weighted_grade = np.average(
-            df.iloc[group]["total_grade"], weights=df.iloc[group]["total_tonnage"]
-        )
+def point_data(df, commodities, ids):
+    """
+    Per-point payload shared by the hover text and the click callback: the
+    commodity name looked up once per distinct commodity, and the point id,
+    resolved to a site URI on the server.
+
+    :param df: pd.DataFrame - Sites or aggregated sites of a trace
+    :param commodities: dict - Commodity records keyed by id
+    :param ids: np.ndarray - Id of every point
+    :return: np.ndarray - (n, 2) object array of (commodity name, point id)
+    """
+    codes, uniques = pd.factorize(df["commodity"])
+    names = np.array([commodities[uid]["name"] for uid in uniques] + [None], object)
+    ids = np.asarray(ids).astype(object)
+    return np.column_stack((names[codes], ids))
+
+
+def _significant(values, digits=4):
+    """Rounds to significant digits, which keeps the JSON of the values short"""
+    return np.array([float(f"{value:.{digits}g}") for value in values.ravel()])
+
+
+@lru_cache(maxsize=None)
+def figure_skeleton():
+    """
+    Static part of the grade-tonnage plot, built once per process: the constant
+    contained metal lines merged into a single trace, with a gap between lines,
+    and the base layout. The returned dicts are shared and must not be modified.
+
+    :return: tuple - (iso-line trace dict, layout dict)
+    """
+    lines = len(ISO_METAL_CONTENTS)
+    gap = np.full((lines, 1), np.nan)
+    tonnage = np.tile(ISO_TONNAGE_RANGE, (lines, 1))
+    grade = ISO_METAL_CONTENTS[:, None] / tonnage  # Grade = Metal Content / Tonnage
+    metal = np.repeat(ISO_METAL_CONTENTS, len(ISO_TONNAGE_RANGE) + 1)
+
+    iso_lines = go.Scatter(
+        y=_significant(np.hstack((tonnage, gap))),
+        x=_significant(np.hstack((grade, gap))),
+        customdata=_significant(metal),
+        mode="lines",
+        line=dict(color="grey", dash="dash"),
+        showlegend=False,
+        hovertemplate="<span style='color: white;'><b>Contained Metal:</b> %{customdata:.0e} Mt</span><extra></extra>",
+    ).to_plotly_json()
+
+    layout = go.Layout(
+        xaxis=dict(
+            type="log",
+            title="Tonnage, in million tonnes",
+            title_font=dict(size=23, family="Arial Bold, sans-serif"),
+        ),
+        yaxis=dict(
+            type="log",
+            title="Grade, in percent",
+            title_font=dict(size=23, family="Arial Bold, sans-serif"),
+        ),
+        hovermode="closest",
+        autosize=True,
+        height=750,
+        template="plotly_white",
+        dragmode="pan",
+    ).to_plotly_json()
+    return iso_lines, layout
 
-        # Combine ms_name values from the group
-        if len(df.iloc[group]["ms_name"]) > 1:
-            combined_ms_name = ":: " + ":: ".join(df.iloc[group]["ms_name"])
-        else:
-            combined_ms_name = ":: ".join(df.iloc[group]["ms_name"])
-
-        # Combine ms values from the group
-        if len(df.iloc[group]["ms"]) > 1:
-            combined_ms = ":: " + ":: ".join(df.iloc[group]["ms"])
-        else:
-            combined_ms = ":: ".join(df.iloc[group]["ms"])
-
-        # Retrieve consistent values for other columns
-        ms_value = df.iloc[group[0]]["ms"]
-        commodity_value = df.iloc[group[0]]["commodity"]
-        top1_deposit_name_value = df.iloc[group[0]]["top1_deposit_name"]
-        lat = df.iloc[group[0]]["lat"]
-        lon = df.iloc[group[0]]["lon"]
-
-        aggregated_data.append(
-            {
-                "total_grade": weighted_grade,
-                "total_tonnage": total_tonnage,
-                "ms_name": combined_ms_name,
-                "ms": combined_ms,
-                "commodity": commodity_value,
-                "top1_deposit_name": top1_deposit_name_value,
-                "lat": lat,
-                "lon": lon,
-            }
-        )
 
-    return pd.DataFrame(aggregated_data)
+def point_ids(gt, df):
+    """
+    Ids of the points of a trace: the row in gt.df of each site, or of the first
+    site of each aggregated site. They are the same at every proximity value,
+    so traces whose groups did not change keep their customdata.
 
+    :param gt: GradeTonnage - Initialized model
+    :param df: pd.DataFrame - Sites or aggregated sites of a trace, indexed
+        like gt.df
+    :return: np.ndarray - Id of every point
+    """
+    return gt.df.index.get_indexer(df.index)
 
-def get_gt_model(gt, proximity_value=0):
-    """A function to generate grade-tonnage plot."""
 
-    if not gt:
-        return None
+def point_uris(gt):
+    """
+    The id -> URI index of the points of the traces of a model, see point_ids.
+
+    :return: np.ndarray - URI of every point id
+    """
+    return gt.df["ms"].to_numpy(object)
 
-    # Sorting the deposit types based on group count, avg (total_contained_metal/total_tonnage)
-    gt.df["avg_metal_per_tonnage"] = (
-        gt.df["total_contained_metal"] / gt.df["total_tonnage"]
-    )
 
+def data_traces(gt, proximity_value=0, hidden_traces=()):
+    """
+    Builds the site traces of the grade-tonnage plot, one per deposit type. The
+    model may be shared by concurrent callbacks of a session, so it is only read.
+
+    :param gt: GradeTonnage - Initialized model
+    :param proximity_value: float - Aggregation distance in kms, 0 for none
+    :param hidden_traces: list - Deposit types hidden in the legend
+    :return: tuple - (trace dicts, aggregated frame of every trace), in the same
+        order for every proximity value
+    """
+    # Sorting the deposit types based on group count, avg (total_contained_metal/total_tonnage)
+    # gt.df may be shared with other sessions, so it is not modified
     grouped = (
-        gt.df.groupby("top1_deposit_name")
+        gt.df.assign(
+            avg_metal_per_tonnage=gt.df["total_contained_metal"]
+            / gt.df["total_tonnage"]
+        )
+        .groupby("top1_deposit_name", observed=True)
         .agg({"top1_deposit_name": "count", "avg_metal_per_tonnage": "mean"})
         .rename(columns={"top1_deposit_name": "count"})
     )
@@ -114,104 +162,177 @@ def get_gt_model(gt, proximity_value=0):
     colors = np.linspace(0, 1, len(unique_labels))
     color_map = {label: color for label, color in zip(unique_labels, colors)}
 
-    gt_model = go.Figure()
-
-    gt.aggregated_df = []
-
+    aggregated = []
     for d_type in unique_labels:
         df_filtered = gt.df[gt.df["top1_deposit_name"] == d_type]
 
         aggregated_df = df_filtered
         if proximity_value != 0:
-            aggregated_df = greedy_weighted_avg_aggregation(
-                df_filtered, gt.distance_caches, proximity_value
-            )
-        gt.aggregated_df.append(aggregated_df)
-
-        hover_template = (
-            "<b>MS Name:</b> %{text}<br>"
-            + "<b>Commodity:</b> %{customdata[0]}<br>"
-            + "<b>Grade:</b> %{y}<br>"
-            + "<b>Tonnage:</b> %{x}<br>"
-            + "<extra></extra>"
-        )
+            aggregated_df = gt.aggregate(d_type, df_filtered, proximity_value)
+        aggregated.append(aggregated_df)
 
+    # Large selections are drawn with WebGL, which keeps panning smooth
+    points = sum(len(aggregated_df) for aggregated_df in aggregated)
+    scatter = "scattergl" if points >= GT_WEBGL_MIN_POINTS else "scatter"
+
+    traces = []
+    for d_type, aggregated_df in zip(unique_labels, aggregated):
         # Get the count of deposits for this type
         deposit_count = grouped.loc[d_type, "count"]
 
-        gt_model.add_trace(
-            go.Scatter(
-                x=aggregated_df["total_tonnage"],
-                y=aggregated_df["total_grade"],
+        traces.append(
+            dict(
+                type=scatter,
+                x=aggregated_df["total_tonnage"].to_numpy(),
+                y=aggregated_df["total_grade"].to_numpy(),
                 mode="markers",
-                text=aggregated_df["ms_name"].apply(
-                    lambda x: x.replace("::", "<br>")
-                ),  # Use truncated names for the labels on the plot
-                hovertemplate=hover_template,  # Use full names for the hover text
-                customdata=pd.DataFrame({"commodity":aggregated_df["commodity"].apply(
-    lambda x: gt.data_cache["commodities"][x]["name"]
-)}),
+                text=aggregated_df["ms_name"]
+                .str.replace("::", "<br>", regex=False)
+                .to_numpy(),  # Use truncated names for the labels on the plot
+                hovertemplate=HOVER_TEMPLATE,  # Use full names for the hover text
+                customdata=point_data(
+                    aggregated_df,
+                    gt.data_cache["commodities"],
+                    point_ids(gt, aggregated_df),
+                ),
                 name=f"{d_type} ({deposit_count})",  # Add the count of deposits to the legend name
                 marker=dict(color=color_map[d_type], size=10, symbol="circle"),
                 textposition="top center",
-                visible=True,
+                visible="legendonly" if d_type in hidden_traces else True,
             )
         )
+    return traces, aggregated
+
+
+def get_gt_model(gt, proximity_value=0, hidden_traces=()):
+    """
+    A function to generate grade-tonnage plot. The figure is returned as a
+    plain dict made of the data traces and the cached figure_skeleton, which
+    skips the validation of a go.Figure on every render.
+
+    :return: tuple - (aggregated frame of every site trace, figure dict)
+    """
+
+    if not gt:
+        return None
+
+    traces, aggregated = data_traces(gt, proximity_value, hidden_traces)
 
     y_min = gt.df["total_grade"].min()
     y_max = gt.df["total_grade"].max()
     x_min = gt.df["total_tonnage"].min()
     x_max = gt.df["total_tonnage"].max()
 
-    # Add slant lines representing constant metal content
-    metal_contents = np.logspace(-9, 10, num=20)
-    for metal_content in metal_contents:
-        # Tonnage values range for plotting the line
-        tonnage_range = np.logspace(-8, 8, 100)
-        grade_values = metal_content / tonnage_range  # Grade = Metal Content / Tonnage
-        hover_text = f"<span style='color: white;'><b>Contained Metal:</b> {metal_content} Mt</span>"
-
-        gt_model.add_trace(
-            go.Scatter(
-                y=tonnage_range,
-                x=grade_values,
-                mode="lines",
-                line=dict(color="grey", dash="dash"),
-                showlegend=False,
-                text=hover_text,
-                hoverinfo="text",
+    iso_lines, layout = figure_skeleton()
+    layout = dict(
+        layout,
+        xaxis=dict(layout["xaxis"], range=[np.log10(x_min / 5), np.log10(x_max * 5)]),
+        yaxis=dict(layout["yaxis"], range=[np.log10(y_min / 5), np.log10(y_max * 5)]),
+        title=dict(
+            text=f"Grade-Tonnage Model of Mineral Deposits ({' & '.join([', '.join(gt.commodities[:-1]), gt.commodities[-1]]) if len(gt.commodities) > 1 else gt.commodities[0]})"
+        ),
+    )
+
+    return aggregated, dict(data=traces + [iso_lines], layout=layout)
+
+
+def get_gt_model_patch(gt, proximity_value, previous=None):
+    """
+    Partial update of a rendered grade-tonnage plot after the proximity value
+    changed. Only the point arrays of the site traces whose groups changed are
+    sent, the layout, the iso-lines and the legend state stay as they are in
+    the browser.
+
+    :param gt: GradeTonnage - The model the plot was rendered from
+    :param proximity_value: float - Aggregation distance in kms, 0 for none
+    :param previous: list - Aggregated frames of the rendered plot, every trace
+        is updated if None
+    :return: tuple - (aggregated frame of every site trace, dash.Patch updating
+        the figure property of the plot)
+    """
+    traces, aggregated = data_traces(gt, proximity_value)
+    if previous is None or len(previous) != len(aggregated):
+        previous = [None] * len(aggregated)
+        retype = True
+    else:
+        points = sum(len(df) for df in previous)
+        retype = (points >= GT_WEBGL_MIN_POINTS) != (traces[0]["type"] == "scattergl")
+
+    patched = Patch()
+    for i, (trace, df, previous_df) in enumerate(zip(traces, aggregated, previous)):
+        # The groups are the same when every site URI list is
+        if previous_df is not None and (
+            df is previous_df or df["ms"].equals(previous_df["ms"])
+        ):
+            if retype:
+                patched["data"][i]["type"] = trace["type"]
+            continue
+        for key in PATCHED_KEYS:
+            patched["data"][i][key] = trace[key]
+    return aggregated, patched
+
+
+if __name__ == "__main__":
+    import timeit
+    from types import SimpleNamespace
+
+    from plotly.io.json import to_json_plotly
+
+    def legacy_static():
+        # The iso-lines and layout as every render built them before the skeleton
+        figure = go.Figure()
+        for metal_content in np.logspace(-9, 10, num=20):
+            tonnage_range = np.logspace(-8, 8, 100)
+            figure.add_trace(
+                go.Scatter(
+                    y=tonnage_range,
+                    x=metal_content / tonnage_range,
+                    mode="lines",
+                    line=dict(color="grey", dash="dash"),
+                    showlegend=False,
+                    text=f"<span style='color: white;'><b>Contained Metal:</b> {metal_content} Mt</span>",
+                    hoverinfo="text",
+                )
             )
+        figure.update_layout(
+            xaxis=dict(type="log", title="Tonnage, in million tonnes"),
+            yaxis=dict(type="log", title="Grade, in percent"),
+            hovermode="closest",
+            autosize=True,
+            height=750,
+            template="plotly_white",
+            dragmode="pan",
         )
+        return figure
 
-    # Logarithmic scale and layout adjustments
-    gt_model.update_layout(
-        xaxis=dict(
-            type="log",
-            title="Tonnage, in million tonnes",
-            title_font=dict(size=23, family="Arial Bold, sans-serif"),
-            range=[np.log10(x_min / 5), np.log10(x_max * 5)],
-        ),
-        yaxis=dict(
-            type="log",
-            title="Grade, in percent",
-            title_font=dict(size=23, family="Arial Bold, sans-serif"),
-            range=[np.log10(y_min / 5), np.log10(y_max * 5)],
-        ),
-        title=f"Grade-Tonnage Model of Mineral Deposits ({' & '.join([', '.join(gt.commodities[:-1]), gt.commodities[-1]]) if len(gt.commodities) > 1 else gt.commodities[0]})",
-        hovermode="closest",
-        autosize=True,
-        height=750,
-        template="plotly_white",
-        dragmode="pan",
-    )
+    def skeleton_static():
+        iso_lines, layout = figure_skeleton()
+        return dict(data=[iso_lines], layout=dict(layout, title=dict(text="")))
 
-    if len(gt.visible_traces) > 0:
-        for trace in gt_model["data"]:
-            if trace.hovertemplate:
-                trace_name = " ".join(trace["name"].split()[:-1])
-                if trace_name in gt.visible_traces:
-                    trace.visible = True
-                else:
-                    trace.visible = "legendonly"
+    figure_skeleton()
+    for name, build in (("legacy", legacy_static), ("skeleton", skeleton_static)):
+        seconds = min(timeit.repeat(build, number=5, repeat=3)) / 5
+        payload = len(to_json_plotly(build()))
+        print(f"static part {name:>8}: {seconds * 1000:7.2f} ms, {payload:>7} bytes")
 
-    return gt, gt_model
+    rng = np.random.default_rng(0)
+    for n in (1000, 10000):
+        df = pd.DataFrame(
+            {
+                "top1_deposit_name": rng.choice([f"Type {i}" for i in range(30)], n),
+                "total_tonnage": rng.lognormal(0, 2, n),
+                "total_grade": rng.lognormal(0, 1, n),
+                "ms_name": [f"Site {i}" for i in range(n)],
+                "ms": [f"https://minmod.isi.edu/resource/site{i}" for i in range(n)],
+                "commodity": "Q589",
+            }
+        )
+        df["total_contained_metal"] = df["total_tonnage"] * df["total_grade"] / 100
+        gt = SimpleNamespace(
+            df=df,
+            commodities=["copper"],
+            data_cache={"commodities": {"Q589": {"name": "Copper"}}},
+        )
+        seconds = min(timeit.repeat(lambda: get_gt_model(gt), number=3, repeat=3)) / 3
+        payload = len(to_json_plotly(get_gt_model(gt)[1]))
+        print(f"render {n:>6} sites: {seconds * 1000:7.2f} ms, {payload:>8} bytes")
@@ -16,5 +16,103 @@ light_ree_minerals = list(
 )
 
 CRITICAL_MINERALS = minerals.union(ree_minerals)
+
+# Pseudo-commodities of the GT model standing for a group of minerals
+COMMODITY_GROUPS = {
+    "REE": ree_minerals,
+    "HEAVY-REE": heavy_ree_minerals,
+    "LIGHT-REE": light_ree_minerals,
+    "PGE": pge_minerals,
+}
 SPARQL_ENDPOINT = os.environ.get("SPARQL_ENDPOINT", "https://minmod.isi.edu/sparql")
 API_ENDPOINT = os.environ.get("API_ENDPOINT", "https://minmod.isi.edu/api/v1")
+
+# HTTP client settings for the MinMod API and SPARQL endpoints
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 4))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 16))
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 3))
+HTTP_BACKOFF_FACTOR = float(os.environ.get("HTTP_BACKOFF_FACTOR", 0.5))
+HTTP_BACKOFF_JITTER = float(os.environ.get("HTTP_BACKOFF_JITTER", 0.5))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 10))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 300))
+
+# Streaming fetch settings for the async data-service client
+FETCH_CONCURRENCY = int(os.environ.get("FETCH_CONCURRENCY", 4))
+FETCH_TOTAL_TIMEOUT = float(os.environ.get("FETCH_TOTAL_TIMEOUT", 180))
+FETCH_CONNECT_TIMEOUT = float(os.environ.get("FETCH_CONNECT_TIMEOUT", 10))
+FETCH_READ_TIMEOUT = float(os.environ.get("FETCH_READ_TIMEOUT", 60))
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", 64 * 1024))
+
+# On-disk response cache for the MinMod API
+HTTP_CACHE_ENABLED = os.environ.get("HTTP_CACHE_ENABLED", "true").lower() == "true"
+HTTP_CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", ".cache/http")
+HTTP_CACHE_MAX_BYTES = int(os.environ.get("HTTP_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+# Refresh interval of the shared reference data (countries, deposit types, ...)
+REFERENCE_DATA_TTL = float(os.environ.get("REFERENCE_DATA_TTL", 60 * 60))
+
+# Memory-mapped snapshots shared by all workers (tmpfs when available)
+SNAPSHOT_DIR = os.environ.get(
+    "SNAPSHOT_DIR",
+    "/dev/shm/minmod-snapshots" if os.path.isdir("/dev/shm") else ".cache/snapshots",
+)
+SITE_SNAPSHOT_TTL = float(os.environ.get("SITE_SNAPSHOT_TTL", 60 * 60))
+
+# Incremental refresh of the site snapshots. Set DEDUP_MODIFIED_SINCE_PARAM to
+# the query parameter name if the API can list only sites changed since a time;
+# otherwise changes are found by diffing content digests of the full list.
+DEDUP_MODIFIED_SINCE_PARAM = os.environ.get("DEDUP_MODIFIED_SINCE_PARAM", "")
+SITE_FULL_SYNC_INTERVAL = float(os.environ.get("SITE_FULL_SYNC_INTERVAL", 24 * 60 * 60))
+
+# Parquet copies of the site snapshots reloaded at startup (requires pyarrow)
+SNAPSHOT_PERSIST_ENABLED = (
+    os.environ.get("SNAPSHOT_PERSIST_ENABLED", "true").lower() == "true"
+)
+SNAPSHOT_PERSIST_DIR = os.environ.get("SNAPSHOT_PERSIST_DIR", ".cache/frames")
+# Restored frames older than SITE_SNAPSHOT_TTL are served while they are synced in
+# the background, up to this age
+SNAPSHOT_PERSIST_TTL = float(os.environ.get("SNAPSHOT_PERSIST_TTL", 7 * 24 * 60 * 60))
+
+# In-process cache of normalized site frames shared by every page
+SITE_FRAME_CACHE_MAX_BYTES = int(
+    os.environ.get("SITE_FRAME_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+)
+SITE_FRAME_CACHE_TTL = float(os.environ.get("SITE_FRAME_CACHE_TTL", 10 * 60))
+
+# In-process cache of the GT proximity groups and aggregations, keyed by the
+# commodity selection and a digest of its site frame
+GT_CACHE_MAX_BYTES = int(os.environ.get("GT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+GT_CACHE_TTL = float(os.environ.get("GT_CACHE_TTL", 60 * 60))
+
+# Prepared models of each browser session, looked up by a token kept client-side
+SESSION_STORE_MAX_BYTES = int(
+    os.environ.get("SESSION_STORE_MAX_BYTES", 256 * 1024 * 1024)
+)
+SESSION_STORE_TTL = float(os.environ.get("SESSION_STORE_TTL", 30 * 60))
+
+# Results kept server-side for the browser, which only holds their keys. They are
+# also pickled to RESULT_STORE_DIR, so any worker process can serve a request of
+# the session (an empty RESULT_STORE_DIR keeps them in the rendering process only)
+RESULT_STORE_MAX_BYTES = int(
+    os.environ.get("RESULT_STORE_MAX_BYTES", 256 * 1024 * 1024)
+)
+RESULT_STORE_TTL = float(os.environ.get("RESULT_STORE_TTL", 30 * 60))
+RESULT_STORE_DIR = os.environ.get("RESULT_STORE_DIR", ".cache/results")
+# Expired results are removed from RESULT_STORE_DIR at most once per interval, in
+# a background thread
+RESULT_STORE_SWEEP_INTERVAL = float(
+    os.environ.get("RESULT_STORE_SWEEP_INTERVAL", 5 * 60)
+)
+
+# Process pool running CPU-bound model steps on large selections (0 disables it)
+PROCESS_POOL_WORKERS = int(
+    os.environ.get("PROCESS_POOL_WORKERS", min(4, (os.cpu_count() or 1) - 1))
+)
+GT_POOL_MIN_SITES = int(os.environ.get("GT_POOL_MIN_SITES", 20000))
+
+# Check interval of the site snapshots behind the prepared GT frames of the
+# commodity groups, a group is rebuilt when one of them changed or is stale
+GT_GROUP_REFRESH_INTERVAL = float(os.environ.get("GT_GROUP_REFRESH_INTERVAL", 10 * 60))
+
+# Number of GT plot points from which traces are drawn with WebGL
+GT_WEBGL_MIN_POINTS = int(os.environ.get("GT_WEBGL_MIN_POINTS", 5000))
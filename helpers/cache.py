@@ -0,0 +1,152 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from helpers.singleflight import SingleFlight
+from logger_config import logger
+
+
+def sizeof(value):
+    """
+    Estimates the memory held by a cached value in bytes.
+
+    :param value: pd.DataFrame, np.ndarray, an object with an nbytes attribute, a
+        container of those or any object
+    :return: int - Size in bytes
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(map(sizeof, value.values()))
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(map(sizeof, value))
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+def frame_digest(df):
+    """
+    Content digest of a DataFrame, used as the data version in cache keys.
+
+    :param df: pd.DataFrame
+    :return: str - Hex digest of the values and row order of every column
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(list(df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    A thread-safe in-process cache bounded by the total size of its values. The
+    least recently used entries are evicted once max_bytes is exceeded and every
+    entry expires ttl seconds after it was stored, unless stored with its own
+    ttl. Values are shared between callers, so they must not be mutated.
+    """
+
+    def __init__(self, max_bytes, ttl, sizeof=sizeof):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        :return: dict - Hit, miss, eviction and expiration counts, entries and size
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "nbytes": self.nbytes,
+            }
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value of a key.
+
+        :return: The value, or default when it is missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() >= entry[2]:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, ttl=None):
+        """
+        Stores a value, evicting least recently used entries to make room.
+
+        :param ttl: float - Lifetime of this entry in seconds, the cache ttl if None
+        """
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            logger.warning(f"Not caching {key}: {size} bytes exceeds the cache size")
+            return value
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return value
+
+    def get_or_load(self, key, load, ttl=None):
+        """
+        Returns the cached value of a key, calling load() on a miss. Concurrent
+        misses of the same key share a single load.
+
+        :param key: Hashable cache key
+        :param load: callable - Builds the value
+        :param ttl: float - Lifetime of a loaded entry, the cache ttl if None
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        return self._flight.do(key, self._load, key, load, ttl)
+
+    def _load(self, key, load, ttl):
+        # A concurrent load may have finished while this call was queued
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and time.time() < entry[2]:
+            return entry[0]
+        return self.put(key, load(), ttl)
+
+    def invalidate(self, key=None):
+        """Drops one entry, or every entry when no key is given"""
+        with self._lock:
+            for k in [key] if key is not None else list(self._entries):
+                if k in self._entries:
+                    self._remove(k)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.nbytes -= size
@@ -1,10 +1,105 @@
 import requests
-from constants import API_ENDPOINT
+from constants import (
+    API_ENDPOINT,
+    FETCH_CONCURRENCY,
+    FETCH_TOTAL_TIMEOUT,
+    FETCH_CONNECT_TIMEOUT,
+    FETCH_READ_TIMEOUT,
+    STREAM_CHUNK_SIZE,
+)
+from helpers import (
+    http_client,
+    http_cache,
+    event_loop,
+    json_codec,
+    json_stream,
+    singleflight,
+)
 import aiohttp
 import asyncio
+import queue
 import time
 from logger_config import logger
 
+# Concurrent identical requests share one upstream call and one decoded result
+sync_flight = singleflight.SingleFlight()
+async_flight = singleflight.AsyncSingleFlight()
+
+
+def request_key(url, params=None, headers=None, project=None, digest=False):
+    """Builds the single-flight key of a request and the way its body is decoded"""
+    key = http_cache.cache_key(url, params)
+    if headers:
+        key += ":" + http_cache.cache_key("", headers)
+    if project:
+        key += ":" + project.__name__
+    if digest:
+        key += ":digest"
+    return key
+
+
+def is_upstream_error(err):
+    """True for errors worth answering from a stale cached response"""
+    if isinstance(err, requests.exceptions.HTTPError):
+        return err.response is not None and err.response.status_code >= 500
+    if isinstance(err, aiohttp.ClientResponseError):
+        return err.status >= 500
+    return True
+
+
+def iter_response_body(url, params=None, headers=None, ssl_flag=True):
+    """
+    Yields the body of a GET request in chunks. Cached responses are revalidated
+    with If-None-Match/If-Modified-Since and served as-is on 304 or when the
+    upstream fails; fresh bodies are written to the cache while they stream.
+    """
+    cache = http_cache.get_cache()
+    entry = cache.lookup(url, params) if cache else None
+    request_headers = dict(headers or {})
+    if entry:
+        request_headers.update(entry.validators())
+
+    try:
+        response = http_client.get(
+            url, params=params, headers=request_headers, verify=ssl_flag, stream=True
+        )
+        if entry and response.status_code == 304:
+            response.close()
+            cache.touch(entry)
+            yield from entry.iter_body()
+            return
+        if not response.ok:
+            # Error bodies are small, reading it keeps err.response.text usable and
+            # closing the streamed response releases its pooled connection
+            try:
+                response.content
+            finally:
+                response.close()
+            response.raise_for_status()
+    except requests.exceptions.RequestException as err:
+        if not entry or not is_upstream_error(err):
+            raise
+        logger.warning(f"Serving cached response for {url} after upstream error: {err}")
+        cache.touch(entry)
+        yield from entry.iter_body()
+        return
+
+    with response:
+        writer = cache.writer(url, params) if cache else None
+        try:
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                if writer:
+                    writer.write(chunk)
+                yield chunk
+        except BaseException:
+            if writer:
+                writer.discard()
+            raise
+        if writer:
+            writer.commit(
+                response.headers.get("ETag"), response.headers.get("Last-Modified")
+            )
+
 
 def fetch_api_data(path, ssl_flag=True, headers=None, params=None):
     """
@@ -13,17 +108,61 @@ def fetch_api_data(path, ssl_flag=True, headers=None, params=None):
     :param path: str - Endpoint path to append to the global API_ENDPOINT
     :param ssl_flag: bool - Boolean to enable SSL verification
     :param headers: dict - Optional headers for the API request
-    :param timeout: int - Request timeout in seconds
+    :param params: dict - Optional query parameters for the API request
     :return: dict - Parsed JSON data from the API
     """
     try:
         # Construct the full URL
         url = f"{API_ENDPOINT.rstrip('/')}/{path.lstrip('/')}"
 
-        # Make the GET request
-        response = requests.get(url, params=params, headers=headers, verify=ssl_flag)
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx and 5xx)
-        return response.json()
+        # Make the GET request over the pooled keep-alive session and response cache
+        return sync_flight.do(
+            request_key(url, params, headers),
+            lambda: json_codec.loads(
+                b"".join(iter_response_body(url, params, headers, ssl_flag))
+            ),
+        )
+
+    except requests.exceptions.HTTPError as http_err:
+        logger.error(
+            f"HTTP error occurred: {http_err.response.status_code} - {http_err.response.text}"
+        )
+    except requests.exceptions.Timeout:
+        logger.error("The request timed out. Please try again later.")
+    except requests.exceptions.RequestException as err:
+        logger.error(f"An error occurred while making the API request: {err}")
+    except Exception as err:
+        logger.critical(f"An unexpected error occurred: {err}")
+    return None
+
+
+def fetch_api_items(
+    path, ssl_flag=True, headers=None, params=None, project=None, digest=False
+):
+    """
+    Fetches a JSON array from the API and decodes it element by element while the
+    body streams in, so the full payload is never held in memory at once.
+
+    :param path: str - Endpoint path to append to the global API_ENDPOINT
+    :param ssl_flag: bool - Boolean to enable SSL verification
+    :param headers: dict - Optional headers for the API request
+    :param params: dict - Optional query parameters for the API request
+    :param project: callable - Optional function reducing every element
+    :param digest: bool - Adds the content digest of every element
+    :return: list - Decoded (and projected) array elements
+    """
+    try:
+        url = f"{API_ENDPOINT.rstrip('/')}/{path.lstrip('/')}"
+        return sync_flight.do(
+            request_key(url, params, headers, project, digest),
+            lambda: list(
+                json_stream.iter_array(
+                    iter_response_body(url, params, headers, ssl_flag),
+                    project,
+                    digest,
+                )
+            ),
+        )
 
     except requests.exceptions.HTTPError as http_err:
         logger.error(
@@ -38,6 +177,23 @@ def fetch_api_data(path, ssl_flag=True, headers=None, params=None):
     return None
 
 
+def fetch_dedup_sites(commodity, ssl_flag=False, params=None):
+    """
+    Fetches the dedup mineral sites of a commodity, keeping only the used fields
+    and the content digest of every site.
+
+    :param commodity: str - Commodity name
+    :param params: dict - Optional extra query parameters
+    """
+    return fetch_api_items(
+        "/dedup-mineral-sites",
+        params={"commodity": commodity, **(params or {})},
+        ssl_flag=ssl_flag,
+        project=json_stream.project_site,
+        digest=True,
+    )
+
+
 # Decorator to log runtime using Python's logging
 def log_async_runtime(func):
     """
@@ -56,27 +212,261 @@ def log_async_runtime(func):
     return wrapper
 
 
+async def aiter_cached_body(entry):
+    """Yields a cached body, reading its file off the event loop"""
+    loop = asyncio.get_running_loop()
+    chunks = entry.iter_body()
+    while True:
+        chunk = await loop.run_in_executor(None, next, chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+async def aiter_response_body(session, url, params=None, timeout=None):
+    """
+    Async counterpart of iter_response_body on an aiohttp session. The cache
+    index and body files are accessed in the default executor, so they never
+    block the shared event loop.
+    """
+    loop = asyncio.get_running_loop()
+    cache = http_cache.get_cache()
+    entry = (
+        await loop.run_in_executor(None, cache.lookup, url, params) if cache else None
+    )
+
+    try:
+        response = await session.get(
+            url,
+            params=params,
+            headers=entry.validators() if entry else None,
+            timeout=timeout,
+        )
+        if entry and response.status == 304:
+            response.release()
+            await loop.run_in_executor(None, cache.touch, entry)
+            async for chunk in aiter_cached_body(entry):
+                yield chunk
+            return
+        response.raise_for_status()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+        if not entry or not is_upstream_error(err):
+            raise
+        logger.warning(f"Serving cached response for {url} after upstream error: {err}")
+        await loop.run_in_executor(None, cache.touch, entry)
+        async for chunk in aiter_cached_body(entry):
+            yield chunk
+        return
+
+    async with response:
+        writer = (
+            await loop.run_in_executor(None, cache.writer, url, params)
+            if cache
+            else None
+        )
+        try:
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                if writer:
+                    await loop.run_in_executor(None, writer.write, chunk)
+                yield chunk
+        except BaseException:
+            if writer:
+                await loop.run_in_executor(None, writer.discard)
+            raise
+        if writer:
+            await loop.run_in_executor(
+                None,
+                writer.commit,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+            )
+
+
 # Async function to fetch JSON data with timing
 @log_async_runtime
-async def fetch_json(session, url, params=None):
-    async with session.get(url, params=params) as response:
-        response.raise_for_status()
-        return await response.json()
+async def fetch_json(session, url, params=None, timeout=None):
+    return await async_flight.do(
+        request_key(url, params), read_json, session, url, params, timeout
+    )
 
 
-# Async function to fetch data from all URLs
-async def fetch_all(requests):
-    timeout = aiohttp.ClientTimeout(
-        total=30 * 60,     # Total timeout set to 30 minutes (in seconds)
-        connect=5 * 60,    # Max time to connect to the server (5 minutes)
-        sock_read=15 * 60, # Max time to read data from the server (15 minutes)
-        sock_connect=5 * 60 # Max time to connect the socket (5 minutes)
+async def read_json(session, url, params=None, timeout=None):
+    body = [chunk async for chunk in aiter_response_body(session, url, params, timeout)]
+    return json_codec.loads(b"".join(body))
+
+
+# Async function to stream a JSON array with timing
+@log_async_runtime
+async def fetch_json_items(
+    session, url, params=None, timeout=None, project=None, digest=False
+):
+    return await async_flight.do(
+        request_key(url, params, project=project, digest=digest),
+        read_json_items,
+        session,
+        url,
+        params,
+        timeout,
+        project,
+        digest,
+    )
+
+
+async def read_json_items(
+    session, url, params=None, timeout=None, project=None, digest=False
+):
+    decoder = json_stream.JSONArrayDecoder(digest)
+    items = []
+    async for chunk in aiter_response_body(session, url, params, timeout):
+        for item in decoder.feed(chunk):
+            items.append(project(item) if project else item)
+    for item in decoder.close():
+        items.append(project(item) if project else item)
+    return items
+
+
+async def fetch_dedup_site_items(session, url, params=None, timeout=None):
+    return await fetch_json_items(
+        session,
+        url,
+        params,
+        timeout=timeout,
+        project=json_stream.project_site,
+        digest=True,
     )
+
+
+# Async function to fetch data from all URLs over the shared session
+async def fetch_all(requests):
     requests = [(API_ENDPOINT + url, params) for url, params in requests]
-    connector = aiohttp.TCPConnector(ssl=False)  # Disable SSL verification
-    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-        tasks = [fetch_json(session, url, params) for url, params in requests]
-        return await asyncio.gather(*tasks)
+    session = await event_loop.get_session()
+    tasks = [fetch_json(session, url, params) for url, params in requests]
+    return await asyncio.gather(*tasks)
+
+
+def fetch_all_sync(requests):
+    """
+    Fetches all (path, params) requests on the background event loop and blocks
+    until every response is available.
+
+    :param requests: list - List of (path, params) tuples
+    :return: list - Parsed JSON data in the same order as requests
+    """
+    return event_loop.run(fetch_all(requests))
+
+
+def request_timeout():
+    """Per-request timeout used by the streaming fetch API"""
+    return aiohttp.ClientTimeout(
+        total=FETCH_TOTAL_TIMEOUT,
+        sock_connect=FETCH_CONNECT_TIMEOUT,
+        sock_read=FETCH_READ_TIMEOUT,
+    )
+
+
+async def iter_fetch(
+    requests, concurrency=FETCH_CONCURRENCY, timeout=None, fetch=fetch_json
+):
+    """
+    Fetches (path, params) requests with bounded concurrency and yields each
+    result as soon as it completes.
+
+    :param requests: list - List of (path, params) tuples
+    :param concurrency: int - Maximum number of requests in flight
+    :param timeout: aiohttp.ClientTimeout - Per-request timeout
+    :param fetch: coroutine function - Fetcher called as fetch(session, url, params, timeout=...)
+    :return: async iterator of (index, data) tuples in completion order
+    """
+    timeout = timeout or request_timeout()
+    semaphore = asyncio.Semaphore(concurrency)
+    session = await event_loop.get_session()
+
+    async def bounded_fetch(index, url, params):
+        async with semaphore:
+            return index, await fetch(session, url, params, timeout=timeout)
+
+    tasks = [
+        asyncio.ensure_future(bounded_fetch(i, API_ENDPOINT + url, params))
+        for i, (url, params) in enumerate(requests)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Cancel whatever is still pending if the consumer stops early or fails
+        for task in tasks:
+            task.cancel()
+
+
+_DONE = object()
+
+
+def stream_all(requests, concurrency=FETCH_CONCURRENCY, timeout=None, fetch=fetch_json):
+    """
+    Synchronous counterpart of iter_fetch for Dash callbacks. Results are
+    fetched on the background event loop and handed over as they complete.
+
+    :param requests: list - List of (path, params) tuples
+    :param concurrency: int - Maximum number of requests in flight
+    :param timeout: aiohttp.ClientTimeout - Per-request timeout
+    :param fetch: coroutine function - Fetcher passed through to iter_fetch
+    :return: iterator of (index, data) tuples in completion order
+    """
+    results = queue.Queue()
+
+    async def produce():
+        try:
+            async for item in iter_fetch(requests, concurrency, timeout, fetch):
+                results.put(item)
+        except BaseException as err:
+            results.put(err)
+            raise
+        finally:
+            results.put(_DONE)
+
+    future = event_loop.submit(produce())
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        future.cancel()
+
+
+def fetch_each(requests, callback, concurrency=FETCH_CONCURRENCY, timeout=None):
+    """
+    Calls callback(index, data) in the calling thread for every request as
+    soon as its response is available.
+
+    :param requests: list - List of (path, params) tuples
+    :param callback: callable - Function receiving (index, data)
+    """
+    for index, data in stream_all(requests, concurrency, timeout):
+        callback(index, data)
+
+
+def stream_dedup_sites(commodities, concurrency=FETCH_CONCURRENCY, params=None):
+    """
+    Streams the projected dedup mineral sites of several commodities.
+
+    :param commodities: list - Commodity names
+    :param params: list - Optional extra query parameters of every commodity
+    :return: iterator of (index, sites) tuples in completion order
+    """
+    return stream_all(
+        [
+            ("/dedup-mineral-sites", {"commodity": commodity, **(extra or {})})
+            for commodity, extra in zip(
+                commodities, params or [None] * len(commodities)
+            )
+        ],
+        concurrency,
+        fetch=fetch_dedup_site_items,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+import asyncio
+import atexit
+import os
+import threading
+
+import aiohttp
+
+from constants import HTTP_POOL_MAXSIZE
+from logger_config import logger
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+_session = None
+
+
+def _run_forever(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_loop():
+    """
+    Returns the long-lived background event loop, starting its thread on first use.
+
+    The loop is recreated after a fork (e.g. gunicorn workers) since threads do not
+    survive it.
+    """
+    global _loop, _loop_pid, _session
+    pid = os.getpid()
+    if _loop is None or _loop_pid != pid:
+        with _loop_lock:
+            if _loop is None or _loop_pid != pid:
+                _loop = asyncio.new_event_loop()
+                _loop_pid = pid
+                _session = None
+                threading.Thread(
+                    target=_run_forever,
+                    args=(_loop,),
+                    name="minmod-event-loop",
+                    daemon=True,
+                ).start()
+    return _loop
+
+
+async def get_session():
+    """
+    Returns the shared aiohttp ClientSession. Must be awaited on the background loop.
+    """
+    global _session
+    if _session is None or _session.closed:
+        timeout = aiohttp.ClientTimeout(
+            total=30 * 60,  # Total timeout set to 30 minutes (in seconds)
+            connect=5 * 60,  # Max time to connect to the server (5 minutes)
+            sock_read=15 * 60,  # Max time to read data from the server (15 minutes)
+            sock_connect=5 * 60,  # Max time to connect the socket (5 minutes)
+        )
+        connector = aiohttp.TCPConnector(
+            ssl=False,  # Disable SSL verification
+            limit_per_host=HTTP_POOL_MAXSIZE,
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return _session
+
+
+def submit(coro):
+    """
+    Schedules a coroutine on the background loop from any thread.
+
+    :param coro: coroutine - Coroutine to run on the shared loop
+    :return: concurrent.futures.Future - Future holding the coroutine result
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run(coro, timeout=None):
+    """
+    Runs a coroutine on the background loop and blocks until it finishes.
+
+    This is the sync bridge for Dash callbacks; it must not be called from the
+    background loop itself.
+
+    :param coro: coroutine - Coroutine to run on the shared loop
+    :param timeout: float - Optional number of seconds to wait for the result
+    :return: The coroutine result
+    """
+    return submit(coro).result(timeout)
+
+
+async def _close_session():
+    if _session is not None and not _session.closed:
+        await _session.close()
+
+
+@atexit.register
+def shutdown():
+    """Closes the shared session and stops the background loop"""
+    if _loop is None or _loop_pid != os.getpid() or not _loop.is_running():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_close_session(), _loop).result(5)
+    except Exception as err:
+        logger.warning(f"Failed to close the shared aiohttp session: {err}")
+    _loop.call_soon_threadsafe(_loop.stop)
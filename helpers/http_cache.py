@@ -0,0 +1,189 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing
+from urllib.parse import urlencode
+
+from constants import (
+    HTTP_CACHE_ENABLED,
+    HTTP_CACHE_DIR,
+    HTTP_CACHE_MAX_BYTES,
+    STREAM_CHUNK_SIZE,
+)
+from logger_config import logger
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def cache_key(url, params=None):
+    """Builds a stable cache key from the request URL and its query parameters"""
+    if params:
+        url = f"{url}?{urlencode(sorted(params.items()))}"
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+class CacheEntry:
+    """Metadata of a cached response body"""
+
+    def __init__(self, key, path, etag, last_modified):
+        self.key = key
+        self.path = path
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def validators(self):
+        """Conditional request headers to revalidate this entry"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def iter_body(self, chunk_size=STREAM_CHUNK_SIZE):
+        """Yields the cached body in chunks"""
+        with open(self.path, "rb") as file:
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+class CacheWriter:
+    """Writes a response body to a temporary file and publishes it on commit"""
+
+    def __init__(self, cache, key, url):
+        self.cache = cache
+        self.key = key
+        self.url = url
+        self.size = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.directory, suffix=".tmp")
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk):
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self, etag=None, last_modified=None):
+        self.file.close()
+        self.cache.store(
+            self.key, self.url, self.tmp_path, self.size, etag, last_modified
+        )
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class ResponseCache:
+    """
+    A persistent response cache. Bodies are stored as files next to a SQLite index
+    holding their validators, so entries survive restarts and are shared between
+    worker processes. The least recently used entries are evicted once the total
+    body size exceeds max_bytes.
+    """
+
+    def __init__(self, directory=HTTP_CACHE_DIR, max_bytes=HTTP_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, "index.sqlite3")
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    url TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    size INTEGER,
+                    stored_at REAL,
+                    accessed_at REAL
+                )""")
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.index_path, timeout=30))
+
+    def _body_path(self, key):
+        return os.path.join(self.directory, f"{key}.body")
+
+    def lookup(self, url, params=None):
+        """
+        Returns the cached entry for a request.
+
+        :return: CacheEntry or None if the request was never cached
+        """
+        key = cache_key(url, params)
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT etag, last_modified FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        path = self._body_path(key)
+        if row is None or not os.path.exists(path):
+            return None
+        return CacheEntry(key, path, row[0], row[1])
+
+    def touch(self, entry):
+        """Marks an entry as recently used"""
+        with self._connect() as conn, conn:
+            conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE key = ?",
+                (time.time(), entry.key),
+            )
+
+    def writer(self, url, params=None):
+        return CacheWriter(self, cache_key(url, params), url)
+
+    def store(self, key, url, tmp_path, size, etag, last_modified):
+        """Atomically publishes a written body and records its validators"""
+        os.replace(tmp_path, self._body_path(key))
+        now = time.time()
+        with self._connect() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, url, etag, last_modified, size, now, now),
+            )
+        self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes"""
+        with self._connect() as conn, conn:
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                path = self._body_path(key)
+                if os.path.exists(path):
+                    os.remove(path)
+                total -= size
+
+
+def get_cache():
+    """
+    Returns the process-wide response cache, or None when caching is disabled or
+    the cache directory cannot be used.
+    """
+    global _cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = ResponseCache()
+                except (OSError, sqlite3.Error) as err:
+                    logger.warning(f"HTTP response cache disabled: {err}")
+                    return None
+    return _cache
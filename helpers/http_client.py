@@ -0,0 +1,104 @@
+import os
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from constants import (
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_FACTOR,
+    HTTP_BACKOFF_JITTER,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+)
+
+# Transient upstream failures worth retrying
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+class JitteredRetry(Retry):
+    """urllib3 Retry with a random jitter added on top of the exponential backoff"""
+
+    jitter = HTTP_BACKOFF_JITTER
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return 0
+        return backoff + random.uniform(0, self.jitter)
+
+
+def build_session():
+    """
+    Builds a requests session backed by bounded, keep-alive connection pools.
+
+    :return: requests.Session - Session with retrying adapters mounted for http(s)
+    """
+    retries = JitteredRetry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        read=HTTP_MAX_RETRIES,
+        status=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        # SPARQL queries are sent as POST but are read-only
+        allowed_methods=frozenset(["GET", "HEAD", "POST"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        pool_block=True,  # Bound the number of open sockets per host
+        max_retries=retries,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session():
+    """
+    Returns the process-wide pooled session, creating it on first use.
+
+    A new session is built after a fork (e.g. gunicorn workers) so that pooled
+    sockets are never shared between processes.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = build_session()
+                _session_pid = pid
+    return _session
+
+
+def request(method, url, timeout=None, **kwargs):
+    """
+    Sends a request through the pooled session with explicit connect/read timeouts.
+
+    :param method: str - HTTP method
+    :param url: str - Absolute URL
+    :param timeout: tuple - Optional (connect, read) timeout in seconds
+    :return: requests.Response
+    """
+    if timeout is None:
+        timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    return get_session().request(method, url, timeout=timeout, **kwargs)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
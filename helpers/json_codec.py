@@ -0,0 +1,82 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the standard library
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+
+def loads(data):
+    """
+    Decodes a JSON document.
+
+    :param data: bytes or str - JSON document
+    :return: Decoded Python object
+    """
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    """
+    Encodes an object as a JSON string.
+
+    :param obj: JSON serializable object
+    :return: str - JSON document
+    """
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+    return json.dumps(obj)
+
+
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    # A synthetic /dedup-mineral-sites payload shaped like the real API response
+    def site(i):
+        return {
+            "id": f"site{i:07d}",
+            "name": f"Mineral Site {i}",
+            "type": random.choice(["Past Producer", "Prospect", "Occurrence"]),
+            "rank": random.choice(["A", "B", "C", "D", "E"]),
+            "location": {
+                "country": [f"Q{random.randint(1, 200)}"],
+                "state_or_province": [f"Q{random.randint(1, 3000)}"],
+                "lat": random.uniform(-90, 90),
+                "lon": random.uniform(-180, 180),
+            },
+            "deposit_types": [
+                {
+                    "id": f"Q{random.randint(380, 600)}",
+                    "source": "algorithm predictions, SRI deposit type classification",
+                    "confidence": random.random(),
+                }
+                for _ in range(5)
+            ],
+            "grade_tonnage": [
+                {
+                    "commodity": "Q578",
+                    "total_contained_metal": random.random() * 10,
+                    "total_tonnage": random.random() * 100,
+                    "total_grade": random.random() * 5,
+                }
+            ],
+        }
+
+    payload = [site(i) for i in range(20000)]
+    encoded = json.dumps(payload).encode("utf-8")
+    number = 5
+
+    print(f"payload: {len(payload)} sites, {len(encoded) / 1e6:.1f} MB")
+    print(f"{'operation':<28}{'json':>10}{'codec (' + BACKEND + ')':>20}")
+    for name, baseline, codec in [
+        ("decode", lambda: json.loads(encoded), lambda: loads(encoded)),
+        ("encode", lambda: json.dumps(payload), lambda: dumps(payload)),
+    ]:
+        baseline_time = timeit.timeit(baseline, number=number) / number
+        codec_time = timeit.timeit(codec, number=number) / number
+        print(f"{name:<28}{baseline_time * 1000:>8.1f}ms{codec_time * 1000:>18.1f}ms")
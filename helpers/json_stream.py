@@ -0,0 +1,175 @@
+import codecs
+import hashlib
+import json
+import re
+
+# Fields of a /dedup-mineral-sites entry that the models actually read
+SITE_FIELDS = ("id", "name", "type", "rank")
+LOCATION_FIELDS = ("country", "state_or_province", "lat", "lon")
+DEPOSIT_TYPE_FIELDS = ("id", "confidence", "source")
+GRADE_TONNAGE_FIELDS = (
+    "commodity",
+    "total_grade",
+    "total_tonnage",
+    "total_contained_metal",
+)
+
+# Key under which the decoder stores the content digest of an object
+DIGEST_KEY = "_digest"
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+DELIMITERS = " \t\n\r,]"
+
+
+def text_digest(text):
+    """64-bit content digest of the JSON text of an element"""
+    return int.from_bytes(
+        hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+class JSONArrayDecoder:
+    """
+    An incremental decoder for a top-level JSON array.
+
+    Bytes are pushed in with feed() and every array element is returned as soon as
+    it is complete, so only the current element is ever buffered as text. With
+    digest=True every object element also gets the digest of its JSON text under
+    DIGEST_KEY, which is cheaper than serializing it again to detect changes.
+    """
+
+    def __init__(self, digest=False):
+        self._digest = digest
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"  # start -> first -> (value -> next)* -> end
+
+    def feed(self, chunk, final=False):
+        """
+        Decodes a chunk of bytes.
+
+        :param chunk: bytes - Next chunk of the response body
+        :param final: bool - True when no more data will follow
+        :return: list - Array elements completed by this chunk
+        """
+        self._buffer = self._buffer[self._pos :] + self._text.decode(chunk, final)
+        self._pos = 0
+        items = []
+
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos >= len(self._buffer):
+                break
+
+            char = self._buffer[self._pos]
+            if self._state == "start":
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                self._pos += 1
+                self._state = "first"
+            elif self._state in ("first", "next") and char == "]":
+                self._pos += 1
+                self._state = "end"
+            elif self._state == "next":
+                if char != ",":
+                    raise ValueError(f"Expected ',' at offset {self._pos}")
+                self._pos += 1
+                self._state = "value"
+            elif self._state in ("first", "value"):
+                try:
+                    item, end = self._decoder.raw_decode(self._buffer, self._pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break  # Element is not complete yet, wait for more data
+                if (
+                    not final
+                    and not isinstance(item, (dict, list, str))
+                    and (
+                        end == len(self._buffer) or self._buffer[end] not in DELIMITERS
+                    )
+                ):
+                    break  # A number or literal may still be cut short
+                if self._digest and isinstance(item, dict):
+                    item[DIGEST_KEY] = text_digest(self._buffer[self._pos : end])
+                items.append(item)
+                self._pos = end
+                self._state = "next"
+            else:
+                raise ValueError("Unexpected data after the end of the JSON array")
+
+        return items
+
+    def close(self):
+        """
+        Flushes the decoder once the body is exhausted.
+
+        :return: list - Remaining array elements
+        """
+        items = self.feed(b"", final=True)
+        if self._state != "end":
+            raise ValueError("Truncated JSON array")
+        return items
+
+
+def project_site(site):
+    """
+    Keeps only the fields of a dedup mineral site that the normalizer reads. The
+    highest confidence deposit type and the first grade-tonnage entry are kept.
+    """
+    projected = {key: site[key] for key in SITE_FIELDS if key in site}
+    if DIGEST_KEY in site:
+        projected[DIGEST_KEY] = site[DIGEST_KEY]
+
+    location = site.get("location")
+    if isinstance(location, dict):
+        projected["location"] = {
+            key: location[key] for key in LOCATION_FIELDS if key in location
+        }
+    elif "location" in site:
+        projected["location"] = location
+
+    if "deposit_types" in site:
+        deposit_types = site["deposit_types"]
+        if deposit_types:
+            top_deposit = max(deposit_types, key=lambda x: x["confidence"])
+            deposit_types = [
+                {
+                    key: top_deposit[key]
+                    for key in DEPOSIT_TYPE_FIELDS
+                    if key in top_deposit
+                }
+            ]
+        projected["deposit_types"] = deposit_types
+
+    if "grade_tonnage" in site:
+        grade_tonnage = site["grade_tonnage"]
+        if grade_tonnage:
+            grade_tonnage = [
+                {
+                    key: grade_tonnage[0][key]
+                    for key in GRADE_TONNAGE_FIELDS
+                    if key in grade_tonnage[0]
+                }
+            ]
+        projected["grade_tonnage"] = grade_tonnage
+
+    return projected
+
+
+def iter_array(chunks, project=None, digest=False):
+    """
+    Yields the elements of a JSON array from an iterable of byte chunks.
+
+    :param chunks: iterable - Byte chunks of the JSON body
+    :param project: callable - Optional function applied to every element
+    :param digest: bool - Adds the content digest to every object element
+    """
+    decoder = JSONArrayDecoder(digest)
+    for chunk in chunks:
+        for item in decoder.feed(chunk):
+            yield project(item) if project else item
+    for item in decoder.close():
+        yield project(item) if project else item
@@ -0,0 +1,399 @@
+import gc
+import operator
+from contextlib import contextmanager
+from functools import partial
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+from constants import API_ENDPOINT
+
+# Bumped whenever the site frame changes, so persisted frames are rebuilt
+SCHEMA_VERSION = 2
+
+MS_URI_PREFIX = "/".join([API_ENDPOINT.split("/api")[0], "derived", ""])
+
+SITE_COLUMNS = ["ms", "ms_name", "ms_type", "ms_rank", "country", "state_or_province"]
+LOCATION_COLUMNS = ["lat", "lon"]
+DEPOSIT_COLUMNS = [
+    "top1_deposit_name",
+    "top1_deposit_group",
+    "top1_deposit_environment",
+    "top1_deposit_confidence",
+    "top1_deposit_source",
+    "commodity",
+]
+GT_COLUMNS = ["total_grade", "total_tonnage", "total_contained_metal"]
+
+# Fields of the flat rows read by _site_row
+ROW_FIELDS = [
+    "id",
+    "ms_name",
+    "ms_type",
+    "ms_rank",
+    "has_location",
+    "country_id",
+    "state_id",
+    "lat",
+    "lon",
+    "deposit_id",
+    "top1_deposit_confidence",
+    "top1_deposit_source",
+    "commodity",
+    "has_gt",
+    "total_grade",
+    "total_tonnage",
+    "total_contained_metal",
+]
+
+# Columns pandas would infer a numeric dtype for, the others hold strings
+NUMERIC_COLUMNS = {"lat", "lon", "top1_deposit_confidence", *GT_COLUMNS}
+
+# Low-cardinality string columns, stored as pd.Categorical so snapshots can share
+# their codes between workers
+CATEGORY_COLUMNS = [
+    "ms_type",
+    "ms_rank",
+    "country",
+    "state_or_province",
+    "top1_deposit_name",
+    "top1_deposit_group",
+    "top1_deposit_environment",
+    "top1_deposit_source",
+    "commodity",
+]
+
+# Highest confidence deposit type of a site, the first one on ties
+TOP_DEPOSIT = partial(max, key=itemgetter("confidence"))
+
+# Stand-in for a missing "location" key, told apart from it by identity
+NO_LOCATION = {}
+
+
+def _objects(values):
+    """Builds a 1-D object array from a sequence, even one of lists or dicts"""
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _lookup(codes, uniques, table, field, replace=None, value=None):
+    """
+    Joins factorized record ids onto a reference table: every distinct id is
+    looked up once and the result is spread over the rows through the codes of
+    a pd.Categorical, so the rows are not hashed again to find their categories.
+
+    :param replace: np.ndarray - Optional mask of the rows getting value instead
+    :return: pd.Categorical - Field values, NaN when unknown
+    """
+    values = [table[uid][field] if uid in table else None for uid in uniques]
+    lookup = pd.Categorical(values + [value, None])
+    row_codes = lookup.codes[codes]  # code -1 (no id) picks the trailing None
+    if replace is not None:
+        row_codes[replace] = lookup.codes[-2]
+    return pd.Categorical.from_codes(
+        row_codes, lookup.categories
+    ).remove_unused_categories()
+
+
+def _column_order(has_location, has_gt):
+    """
+    Column order of pd.DataFrame(list_of_dicts): keys in order of first
+    appearance, where a row only has lat/lon and GT keys when present.
+    """
+    columns = []
+    shapes = has_location.astype(np.int8) * 2 + has_gt.astype(np.int8)
+    _, first_rows = np.unique(shapes, return_index=True)
+    for row in np.sort(first_rows):
+        row_columns = SITE_COLUMNS[:]
+        if has_location[row]:
+            row_columns += LOCATION_COLUMNS
+        row_columns += DEPOSIT_COLUMNS
+        if has_gt[row]:
+            row_columns += GT_COLUMNS
+        columns += [column for column in row_columns if column not in columns]
+    return columns
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Pauses the cyclic garbage collector. The rows read from a payload are
+    acyclic, but allocating them triggers full collections that walk the whole
+    payload again.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def categorize(df):
+    """
+    Converts the CATEGORY_COLUMNS of a site frame to pd.Categorical, e.g. after
+    concatenating frames whose categories differ.
+
+    :param df: pd.DataFrame - Site frame
+    :return: pd.DataFrame - A new frame, or df itself if nothing was converted
+    """
+    columns = {
+        column: df[column].astype("category")
+        for column in CATEGORY_COLUMNS
+        if column in df and not isinstance(df[column].dtype, pd.CategoricalDtype)
+    }
+    return df.assign(**columns) if columns else df
+
+
+def _site_row(site, deposit_types):
+    """
+    Reads the raw fields of a dedup mineral site into a flat tuple.
+
+    :param site: dict - Dedup mineral site
+    :param deposit_types: dict - Reference deposit types keyed by record id
+    :return: tuple - The row, or None when the site is dropped: it has no
+        deposit type, its top deposit type is unknown or it has no grade-tonnage
+    """
+    if len(site["deposit_types"]) == 0:
+        return None
+    top_deposit = TOP_DEPOSIT(site["deposit_types"])
+    # Filtered before indexing, dropped sites may have an empty grade_tonnage
+    if not deposit_types.get(top_deposit["id"]) or not site.get("grade_tonnage"):
+        return None
+    location = site.get("location", NO_LOCATION)
+    country_ids = location.get("country")
+    state_ids = location.get("state_or_province")
+    gt = site["grade_tonnage"][0]
+    return (
+        site["id"],
+        site["name"],
+        site["type"],
+        site["rank"],
+        location is not NO_LOCATION,
+        country_ids[0] if country_ids else None,
+        state_ids[0] if state_ids else None,
+        location.get("lat"),
+        location.get("lon"),
+        top_deposit["id"],
+        top_deposit["confidence"],
+        top_deposit["source"],
+        gt["commodity"],
+        "total_grade" in gt,
+        gt.get("total_grade"),
+        gt.get("total_tonnage"),
+        gt.get("total_contained_metal"),
+    )
+
+
+def normalize_sites(raw_data, data_cache):
+    """
+    Normalizes dedup mineral sites into the site frame used by every model.
+
+    Every site is read once into a flat row, the rows are transposed into
+    columns and the rest is done on whole columns: reference joins on
+    factorized ids and the "Unknown" rule. The result holds the same values as
+    a DataFrame built from the former per-row clean_and_fix dicts, with the
+    CATEGORY_COLUMNS as pd.Categorical, except that sites without grade-tonnage
+    are dropped instead of raising.
+
+    :param raw_data: list - Dedup mineral sites (projected or full)
+    :param data_cache: dict - Reference tables keyed by record id
+    :return: pd.DataFrame
+    """
+    deposit_types = data_cache["deposit-types"]
+    site_row = partial(_site_row, deposit_types=deposit_types)
+    with _gc_paused():
+        rows = [row for row in map(site_row, raw_data) if row is not None]
+        if not rows:
+            return pd.DataFrame([])
+        fields = dict(zip(ROW_FIELDS, map(_objects, zip(*rows))))
+        del rows
+
+    deposit_codes, deposit_ids = pd.factorize(fields["deposit_id"])
+    has_location = fields["has_location"].astype(bool)
+    has_gt = fields["has_gt"].astype(bool)
+
+    columns = {
+        "ms": _objects(list(map(MS_URI_PREFIX.__add__, fields["id"]))),
+        **{column: fields[column] for column in ROW_FIELDS if column in SITE_COLUMNS},
+        **{
+            column: fields[column] for column in ROW_FIELDS if column in DEPOSIT_COLUMNS
+        },
+    }
+    for column, field, table in [
+        ("country", "country_id", "countries"),
+        ("state_or_province", "state_id", "states-or-provinces"),
+    ]:
+        codes, uniques = pd.factorize(fields[field])
+        columns[column] = _lookup(codes, uniques, data_cache[table], "name")
+    for column in LOCATION_COLUMNS:
+        columns[column] = fields[column]
+        columns[column][~has_location] = np.nan
+    for column in GT_COLUMNS:
+        columns[column] = fields[column]
+        columns[column][~has_gt] = np.nan
+
+    # Sites without both tonnage and grade get the "Unknown" deposit type
+    is_falsy = np.frompyfunc(operator.not_, 1, 1)
+    unknown = (
+        is_falsy(columns["total_tonnage"]) | is_falsy(columns["total_grade"])
+    ).astype(bool)
+    columns["top1_deposit_name"] = _lookup(
+        deposit_codes,
+        deposit_ids,
+        deposit_types,
+        "name",
+        replace=~has_gt | unknown,
+        value="Unknown",
+    )
+    for column, field in [
+        ("top1_deposit_group", "group"),
+        ("top1_deposit_environment", "environment"),
+    ]:
+        columns[column] = _lookup(deposit_codes, deposit_ids, deposit_types, field)
+
+    # Numeric columns get the dtype pandas infers for a list of dicts
+    return categorize(
+        pd.DataFrame(
+            {
+                column: (
+                    pd.Series(columns[column]).infer_objects()
+                    if column in NUMERIC_COLUMNS
+                    else columns[column]
+                )
+                for column in _column_order(has_location, has_gt)
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    def legacy_clean_and_fix(raw_data, data_cache):
+        """The per-row loop formerly copied into every model"""
+        results = []
+        for data in raw_data:
+            if len(data["deposit_types"]) == 0:
+                continue
+            combined_data = {}
+            combined_data["ms"] = "/".join(
+                [API_ENDPOINT.split("/api")[0], "derived", data["id"]]
+            )
+            combined_data["ms_name"] = data["name"]
+            combined_data["ms_type"] = data["type"]
+            combined_data["ms_rank"] = data["rank"]
+            if (
+                "location" in data
+                and "country" in data["location"]
+                and data["location"]["country"]
+                and data["location"]["country"][0] in data_cache["countries"]
+            ):
+                combined_data["country"] = data_cache["countries"][
+                    data["location"]["country"][0]
+                ]["name"]
+            else:
+                combined_data["country"] = None
+            if (
+                "location" in data
+                and "state_or_province" in data["location"]
+                and data["location"]["state_or_province"]
+                and data["location"]["state_or_province"][0]
+                in data_cache["states-or-provinces"]
+            ):
+                combined_data["state_or_province"] = data_cache["states-or-provinces"][
+                    data["location"]["state_or_province"][0]
+                ]["name"]
+            else:
+                combined_data["state_or_province"] = None
+            if "location" in data:
+                combined_data["lat"] = data["location"].get("lat", None)
+                combined_data["lon"] = data["location"].get("lon", None)
+            highest_confidence_deposit = max(
+                data["deposit_types"], key=lambda x: x["confidence"]
+            )
+            deposit_details = data_cache["deposit-types"].get(
+                highest_confidence_deposit["id"], None
+            )
+            if not deposit_details:
+                continue
+            combined_data["top1_deposit_name"] = deposit_details["name"]
+            combined_data["top1_deposit_group"] = deposit_details["group"]
+            combined_data["top1_deposit_environment"] = deposit_details["environment"]
+            combined_data["top1_deposit_confidence"] = highest_confidence_deposit[
+                "confidence"
+            ]
+            combined_data["top1_deposit_source"] = highest_confidence_deposit["source"]
+            combined_data["commodity"] = data["grade_tonnage"][0]["commodity"]
+            if "total_grade" in data["grade_tonnage"][0]:
+                gt = data["grade_tonnage"][0]
+                combined_data["total_grade"] = gt["total_grade"]
+                combined_data["total_tonnage"] = gt["total_tonnage"]
+                combined_data["total_contained_metal"] = gt["total_contained_metal"]
+            if not combined_data.get("total_tonnage") or not combined_data.get(
+                "total_grade"
+            ):
+                combined_data["top1_deposit_name"] = "Unknown"
+            results.append(combined_data)
+        return pd.DataFrame(results)
+
+    def reference(prefix, size, **fields):
+        return {
+            f"{prefix}{i}": {"name": f"{prefix} {i}", **fields} for i in range(size)
+        }
+
+    data_cache = {
+        "countries": reference("C", 250),
+        "states-or-provinces": reference("S", 4000),
+        "deposit-types": reference("D", 200, group="group", environment="env"),
+        "commodities": reference("Q", 100),
+    }
+
+    def site(i):
+        data = {"id": f"site{i}", "name": f"Site {i}", "type": "Prospect", "rank": "B"}
+        if random.random() > 0.05:
+            data["location"] = {
+                "country": [f"C{random.randint(0, 260)}"],
+                "state_or_province": [f"S{random.randint(0, 4100)}"],
+                "lat": random.uniform(-90, 90),
+                "lon": random.uniform(-180, 180),
+            }
+        data["deposit_types"] = [
+            {
+                "id": f"D{random.randint(0, 210)}",
+                "confidence": random.random(),
+                "source": "algorithm predictions",
+            }
+            for _ in range(random.randint(0, 5))
+        ]
+        gt = {"commodity": "Q1"}
+        if random.random() > 0.3:
+            gt.update(
+                total_grade=random.random(),
+                total_tonnage=random.random() * 100,
+                total_contained_metal=random.random(),
+            )
+        data["grade_tonnage"] = [gt]
+        return data
+
+    for size in (10_000, 100_000):
+        payload = [site(i) for i in range(size)]
+
+        start = time.perf_counter()
+        expected = legacy_clean_and_fix(payload, data_cache)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = normalize_sites(payload, data_cache)
+        vectorized_time = time.perf_counter() - start
+
+        pd.testing.assert_frame_equal(actual, categorize(expected))
+        print(
+            f"{size:>7} sites: loop {legacy_time * 1000:8.1f}ms, "
+            f"normalizer {vectorized_time * 1000:8.1f}ms "
+            f"({legacy_time / vectorized_time:.1f}x)"
+        )
@@ -0,0 +1,110 @@
+import json
+import os
+import re
+import tempfile
+import time
+
+from constants import SNAPSHOT_PERSIST_DIR, SNAPSHOT_PERSIST_ENABLED
+from logger_config import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Frames are then not persisted, see ENABLED
+    pa = None
+
+METADATA_KEY = b"minmod"
+SUFFIX = ".parquet"
+
+ENABLED = SNAPSHOT_PERSIST_ENABLED and pa is not None
+if SNAPSHOT_PERSIST_ENABLED and pa is None:
+    logger.warning("pyarrow is not installed, site frames are not persisted")
+
+
+def _path(name, directory=SNAPSHOT_PERSIST_DIR):
+    return os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", name) + SUFFIX)
+
+
+def write_frame(name, df, version, directory=SNAPSHOT_PERSIST_DIR):
+    """
+    Persists a DataFrame to Parquet, stamped with a data version and its creation
+    time, and atomically swaps it in place of the previous file.
+
+    :param name: str - Snapshot name
+    :param df: pd.DataFrame - Frame to store (its index is not kept)
+    :param version: JSON serializable data version of the frame
+    """
+    if not ENABLED:
+        return
+    os.makedirs(directory, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    stamp = json.dumps({"version": version, "created": time.time()})
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), METADATA_KEY: stamp.encode("utf-8")}
+    )
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            pq.write_table(table, file)
+        os.replace(tmp_path, _path(name, directory))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_stamp(name, directory=SNAPSHOT_PERSIST_DIR):
+    """
+    Reads the stamp of a persisted frame from the Parquet footer only.
+
+    :return: dict - Data version and creation time, or None if there is no frame
+    """
+    if not ENABLED:
+        return None
+    try:
+        metadata = pq.read_schema(_path(name, directory)).metadata or {}
+    except FileNotFoundError:
+        return None
+    except (OSError, pa.ArrowException) as err:
+        logger.warning(f"Ignoring unreadable persisted frame {name}: {err}")
+        return None
+    if METADATA_KEY not in metadata:
+        return None
+    return json.loads(metadata[METADATA_KEY])
+
+
+def read_frame(name, version, max_age, directory=SNAPSHOT_PERSIST_DIR):
+    """
+    Loads a persisted frame if it has the expected data version and is younger
+    than max_age.
+
+    :param name: str - Snapshot name
+    :param version: Expected data version
+    :param max_age: float - Maximum age in seconds
+    :return: tuple - (pd.DataFrame, stamp dict) or None if missing or stale
+    """
+    stamp = read_stamp(name, directory)
+    if (
+        stamp is None
+        or stamp["version"] != version
+        or time.time() - stamp["created"] >= max_age
+    ):
+        return None
+    try:
+        df = pq.read_table(_path(name, directory)).to_pandas()
+    except (OSError, pa.ArrowException) as err:
+        logger.warning(f"Ignoring unreadable persisted frame {name}: {err}")
+        return None
+    return df, stamp
+
+
+def names(directory=SNAPSHOT_PERSIST_DIR):
+    """Names of every persisted frame"""
+    if not ENABLED or not os.path.isdir(directory):
+        return []
+    return sorted(
+        file_name[: -len(SUFFIX)]
+        for file_name in os.listdir(directory)
+        if file_name.endswith(SUFFIX)
+    )
@@ -0,0 +1,18 @@
+import pandas as pd
+
+
+def lookup(uris, point_id):
+    """
+    Resolves the id carried in the customdata of a clicked point.
+
+    :param uris: np.ndarray or pd.Series - URI of every point id
+    :param point_id: Id sent back by the browser
+    :return: str - The URI, or None when the id is not in the index
+    """
+    if isinstance(point_id, bool) or not isinstance(point_id, int):
+        return None
+    if not 0 <= point_id < len(uris):
+        return None
+    if isinstance(uris, pd.Series):
+        return uris.iat[point_id]
+    return uris[point_id]
@@ -0,0 +1,131 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from constants import PROCESS_POOL_WORKERS
+from logger_config import logger
+
+# Modules imported once by the fork server, so workers forked from it start warm.
+# Workers are not forked from the web process, whose threads may hold locks. The
+# main script is not preloaded: it starts those threads, and workers import it as
+# __mp_main__, which app.py skips.
+PRELOAD = ["helpers.proximity"]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(PRELOAD)
+            _pool = ProcessPoolExecutor(PROCESS_POOL_WORKERS, mp_context=context)
+        return _pool
+
+
+def _reset():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+class SharedArrays:
+    """
+    float64 arrays copied into a single shared memory block, which pool workers
+    map by name instead of receiving a pickled copy with every task.
+    """
+
+    def __init__(self, arrays):
+        """
+        :param arrays: dict - Named 1-D arrays
+        """
+        arrays = {
+            key: np.ascontiguousarray(array, dtype=np.float64)
+            for key, array in arrays.items()
+        }
+        size = sum(array.nbytes for array in arrays.values())
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.layout = {}
+        offset = 0
+        for key, array in arrays.items():
+            np.ndarray(array.shape, np.float64, self.shm.buf, offset)[:] = array
+            self.layout[key] = (offset, array.shape)
+            offset += array.nbytes
+
+    @property
+    def handle(self):
+        """Picklable reference to the arrays, see attach"""
+        return self.shm.name, self.layout
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@contextmanager
+def attach(handle):
+    """
+    Maps the arrays of a SharedArrays handle in a worker. The arrays are only
+    valid inside the block, so anything kept must be copied.
+
+    :return: dict - Named read-only arrays
+    """
+    name, layout = handle
+    # Pool workers share the resource tracker of the process that created the
+    # block, which unlinks it
+    shm = shared_memory.SharedMemory(name=name)
+    arrays = {}
+    try:
+        for key, (offset, shape) in layout.items():
+            arrays[key] = np.ndarray(shape, np.float64, shm.buf, offset)
+            arrays[key].flags.writeable = False
+        yield arrays
+    finally:
+        arrays.clear()
+        shm.close()
+
+
+def _run(func, handle, task):
+    with attach(handle) as arrays:
+        return func(arrays, task)
+
+
+def map_shared(func, arrays, tasks, parallel=True):
+    """
+    Runs func(arrays, task) for every task, fanned out to the process pool when
+    parallel is set, PROCESS_POOL_WORKERS is not 0 and there is more than one
+    task. Otherwise, or if the pool fails, the tasks run in this process.
+
+    :param func: callable - Module-level function of (dict of arrays, task)
+    :param arrays: dict - Named 1-D float64 arrays shared by every task
+    :param tasks: list - Picklable task arguments
+    :param parallel: bool - Whether the work is worth the pool overhead
+    :return: list - Results in task order
+    """
+    if parallel and PROCESS_POOL_WORKERS > 0 and len(tasks) > 1:
+        try:
+            with SharedArrays(arrays) as shared:
+                futures = [
+                    _executor().submit(_run, func, shared.handle, task)
+                    for task in tasks
+                ]
+                return [future.result() for future in futures]
+        except (BrokenProcessPool, OSError) as err:
+            logger.warning(f"Process pool failed, running in process: {err}")
+            _reset()
+    return [func(arrays, task) for task in tasks]
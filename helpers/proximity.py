@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from helpers import spatial
+
+
+class ProximityGroups:
+    """
+    Greedy proximity grouping of the sites of one deposit type at any scale.
+
+    Going through the sites in row order, every site not grouped yet starts a
+    group with the later ungrouped sites closer than the threshold. The
+    neighborhoods of a NeighborList are sorted by distance once, so a threshold
+    resolves each neighborhood with a binary search.
+    """
+
+    def __init__(self, neighbors):
+        """
+        :param neighbors: spatial.NeighborList - Close pairs of the sites
+        """
+        self.radius = neighbors.radius
+        self.indptr = neighbors.indptr
+        rows = np.repeat(np.arange(len(neighbors)), np.diff(neighbors.indptr))
+        order = np.lexsort((neighbors.distances, rows))
+        self.indices = neighbors.indices[order]
+        self.distances = neighbors.distances[order]
+        # Distance to the closest later neighbor of each site
+        self.nearest = np.full(len(neighbors), np.inf)
+        has_neighbors = np.diff(self.indptr) > 0
+        self.nearest[has_neighbors] = self.distances[self.indptr[:-1][has_neighbors]]
+
+    def __len__(self):
+        return len(self.nearest)
+
+    @property
+    def nbytes(self):
+        return (
+            self.indptr.nbytes
+            + self.indices.nbytes
+            + self.distances.nbytes
+            + self.nearest.nbytes
+        )
+
+    def labels(self, threshold):
+        """
+        Groups of the sites at a proximity threshold.
+
+        :param threshold: float - Grouping distance in kms, at most radius
+        :return: np.ndarray - Row of the first site of the group of every site
+        """
+        if threshold > self.radius:
+            raise ValueError(f"Threshold {threshold} exceeds the radius {self.radius}")
+        labels = np.arange(len(self))
+        processed = np.zeros(len(self), dtype=bool)
+        # Sites without a later neighbor in range can only start a singleton
+        for i in np.flatnonzero(self.nearest < threshold).tolist():
+            if processed[i]:
+                continue
+            start = self.indptr[i]
+            end = start + np.searchsorted(
+                self.distances[start : self.indptr[i + 1]], threshold
+            )
+            members = self.indices[start:end]
+            members = members[~processed[members]]
+            processed[members] = True
+            labels[members] = i
+        return labels
+
+
+def build_groups(arrays, task):
+    """
+    Builds the ProximityGroups of a slice of sites, run as a process pool task.
+
+    :param arrays: dict - "lat" and "lon" arrays of the sites
+    :param task: tuple - (start, end, radius) of the slice
+    :return: ProximityGroups
+    """
+    start, end, radius = task
+    return ProximityGroups(
+        spatial.radius_neighbors(
+            arrays["lat"][start:end].copy(), arrays["lon"][start:end].copy(), radius
+        )
+    )
+
+
+def _combine(values, codes, sizes):
+    """Joins the values of each group, prefixing the groups of several sites"""
+    order = np.argsort(codes, kind="stable")
+    starts = np.cumsum(sizes) - sizes
+    prefixed = np.add(":: ", values[order].astype(object))
+    combined = np.add.reduceat(prefixed, starts) if len(starts) else prefixed
+    return np.where(sizes > 1, combined, values[order][starts])
+
+
+def aggregate(df, labels):
+    """
+    Aggregates the sites of each group: tonnage-weighted grade, total tonnage,
+    combined names and URIs, and the other values of the first site.
+
+    :param df: pd.DataFrame - Sites of a single deposit type
+    :param labels: np.ndarray - Row of the first site of the group of every row
+    :return: pd.DataFrame - One row per group, in order of their first site and
+        indexed by its index label
+    """
+    seeds, codes = np.unique(labels, return_inverse=True)
+    sizes = np.bincount(codes)
+    tonnage = df["total_tonnage"].to_numpy(dtype=np.float64)
+    grade = df["total_grade"].to_numpy(dtype=np.float64)
+    total_tonnage = np.bincount(codes, weights=tonnage)
+    first = df.iloc[seeds]
+
+    return pd.DataFrame(
+        {
+            "total_grade": np.bincount(codes, weights=grade * tonnage) / total_tonnage,
+            "total_tonnage": total_tonnage,
+            "ms_name": _combine(df["ms_name"].to_numpy(), codes, sizes),
+            "ms": _combine(df["ms"].to_numpy(), codes, sizes),
+            "commodity": first["commodity"].to_numpy(),
+            "top1_deposit_name": first["top1_deposit_name"].to_numpy(),
+            "lat": first["lat"].to_numpy(),
+            "lon": first["lon"].to_numpy(),
+        },
+        index=first.index,
+    )
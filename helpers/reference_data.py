@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+
+import pandas as pd
+
+from constants import REFERENCE_DATA_TTL
+from helpers import dataservice_utils, snapshot_store
+from logger_config import logger
+
+# API endpoints holding the reference records joined onto mineral sites
+REFERENCE_TABLES = ("commodities", "countries", "deposit-types", "states-or-provinces")
+
+
+def fetch_reference():
+    """Fetches every reference table into one frame of (table, id, record) rows"""
+    results = dataservice_utils.fetch_all_sync(
+        [("/" + table, None) for table in REFERENCE_TABLES]
+    )
+    rows = [
+        (table, record["uri"].split("/")[-1], record)
+        for table, records in zip(REFERENCE_TABLES, results)
+        for record in records
+    ]
+    return pd.DataFrame(rows, columns=["table", "id", "record"])
+
+
+class ReferenceData:
+    """
+    A process-wide registry of the reference tables, keyed by the record id (the
+    last segment of its URI). Tables are loaded once from the shared snapshot and
+    swapped atomically by a background thread every ttl seconds, so readers never
+    see a partial refresh and only one worker fetches them from the API.
+    """
+
+    def __init__(self, ttl=REFERENCE_DATA_TTL):
+        self.ttl = ttl
+        self.loaded_at = None
+        self.version = None
+        self._tables = None
+        self._lock = threading.Lock()
+        self._refresher_pid = None
+
+    def load(self):
+        """
+        Maps the shared reference snapshot, fetching every reference table when it
+        is missing or older than ttl, and replaces the current tables.
+        """
+        snapshot = snapshot_store.load_or_build("reference", self.ttl, fetch_reference)
+        tables = {table: {} for table in REFERENCE_TABLES}
+        for table, record_id, record in zip(
+            snapshot["table"], snapshot["id"], snapshot["record"]
+        ):
+            tables[table][record_id] = record
+        # Creation time of the snapshot, shared by every worker using it
+        header = snapshot_store.read_header("reference")
+        self._tables = tables
+        self.loaded_at = time.time()
+        self.version = header["created"] if header else self.loaded_at
+        return tables
+
+    def tables(self):
+        """
+        Returns the current reference tables, loading them on first use.
+
+        :return: dict - Mapping of table name to a dict of id -> record
+        """
+        if self._tables is None:
+            with self._lock:
+                if self._tables is None:
+                    self.load()
+        self._start_refresher()
+        return self._tables
+
+    def get(self, table, record_id, default=None):
+        """O(1) lookup of a reference record by its id"""
+        return self.tables()[table].get(record_id, default)
+
+    def _start_refresher(self):
+        pid = os.getpid()
+        if self._refresher_pid == pid:
+            return
+        with self._lock:
+            if self._refresher_pid != pid:
+                self._refresher_pid = pid
+                threading.Thread(
+                    target=self._refresh_forever,
+                    name="minmod-reference-data",
+                    daemon=True,
+                ).start()
+
+    def _refresh_forever(self):
+        while True:
+            time.sleep(self.ttl)
+            try:
+                self.load()
+            except Exception as err:
+                logger.error(f"Failed to refresh reference data: {err}")
+
+
+registry = ReferenceData()
+
+
+def tables():
+    return registry.tables()
+
+
+def get(table, record_id, default=None):
+    return registry.get(table, record_id, default)
@@ -0,0 +1,185 @@
+import base64
+import hashlib
+import os
+import pickle
+import re
+import secrets
+import tempfile
+import threading
+import time
+
+from constants import (
+    RESULT_STORE_DIR,
+    RESULT_STORE_MAX_BYTES,
+    RESULT_STORE_SWEEP_INTERVAL,
+    RESULT_STORE_TTL,
+)
+from helpers import cache
+from logger_config import logger
+
+# Keys are created by new_key, anything else sent by a browser is ignored. A key
+# always refers to the same result
+KEY_PATTERN = re.compile(r"[A-Za-z0-9_-]{22}")
+
+# Results of this process, read before the disk backend
+results = cache.LRUCache(RESULT_STORE_MAX_BYTES, RESULT_STORE_TTL)
+
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def new_key():
+    return secrets.token_urlsafe(16)
+
+
+def shared_key(name):
+    """Key of a result identified by its content, see put_shared"""
+    digest = hashlib.blake2b(repr(name).encode("utf-8"), digest_size=16).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def _valid(key):
+    return isinstance(key, str) and KEY_PATTERN.fullmatch(key) is not None
+
+
+def _path(key):
+    return os.path.join(RESULT_STORE_DIR, key + ".pkl")
+
+
+def _write(key, value):
+    os.makedirs(RESULT_STORE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=RESULT_STORE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, _path(key))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _read(key):
+    path = _path(key)
+    try:
+        if time.time() - os.path.getmtime(path) > RESULT_STORE_TTL:
+            os.unlink(path)
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _remove(key):
+    try:
+        os.unlink(_path(key))
+    except FileNotFoundError:
+        pass
+
+
+def _sweep():
+    """Removes the expired results of the disk backend"""
+    expired = time.time() - RESULT_STORE_TTL
+    try:
+        for entry in os.scandir(RESULT_STORE_DIR):
+            try:
+                if entry.name.endswith(".pkl") and entry.stat().st_mtime < expired:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+    except OSError as err:
+        logger.warning(f"Failed to sweep {RESULT_STORE_DIR}: {err}")
+
+
+def _sweep_in_background():
+    """Sweeps the disk backend in a thread, at most once per sweep interval"""
+    global _last_sweep
+    with _sweep_lock:
+        now = time.time()
+        if now - _last_sweep < RESULT_STORE_SWEEP_INTERVAL:
+            return
+        _last_sweep = now
+    threading.Thread(target=_sweep, name="result-store-sweep", daemon=True).start()
+
+
+def put(value, replaces=None):
+    """
+    Stores a result on the server, so the browser only holds its key. Every
+    result gets a new key, so a copy read by another worker process is never
+    stale.
+
+    :param value: Result to store, shared with readers so it must not be mutated
+    :param replaces: str - Key of a previous result of the same browser session,
+        which is removed
+    :return: str - The key to keep in a dcc.Store
+    """
+    key = new_key()
+    results.put(key, value)
+    if _valid(replaces):
+        results.invalidate(replaces)
+    if RESULT_STORE_DIR:
+        # The disk backend makes results readable by every worker process and
+        # keeps them across restarts
+        try:
+            _write(key, value)
+            if _valid(replaces):
+                _remove(replaces)
+        except OSError as err:
+            logger.warning(f"Failed to store result {key} on disk: {err}")
+        _sweep_in_background()
+    return key
+
+
+def put_shared(name, value):
+    """
+    Stores a result that is the same for every render of its name, such as the
+    URI index of a model version. It is only written when missing, so renders
+    repeating it only refresh its lifetime.
+
+    :param name: Hashable name that changes whenever the value changes
+    :param value: Result to store, or a function building it when it is missing
+    :return: str - The key of the result, never removed by put
+    """
+    key = shared_key(name)
+    cached = results.get(key)
+    if not RESULT_STORE_DIR:
+        if cached is None:
+            results.put(key, value() if callable(value) else value)
+        return key
+    try:
+        # Readers of other processes load it from disk, get caches it here
+        os.utime(_path(key))
+        return key
+    except FileNotFoundError:
+        pass
+    except OSError as err:
+        logger.warning(f"Failed to refresh result {key} on disk: {err}")
+    if cached is None:
+        cached = value() if callable(value) else value
+        results.put(key, cached)
+    try:
+        _write(key, cached)
+    except OSError as err:
+        logger.warning(f"Failed to store result {key} on disk: {err}")
+    return key
+
+
+def get(key):
+    """
+    Returns a stored result.
+
+    :param key: str - Key returned by put, may be None
+    :return: The result, or None when it is missing or expired
+    """
+    if not _valid(key):
+        return None
+    value = results.get(key)
+    if value is None and RESULT_STORE_DIR:
+        try:
+            value = _read(key)
+        except (OSError, pickle.UnpicklingError, EOFError) as err:
+            logger.warning(f"Failed to read result {key} from disk: {err}")
+            return None
+        if value is not None:
+            results.put(key, value)
+    return value
@@ -0,0 +1,44 @@
+import secrets
+
+from constants import SESSION_STORE_MAX_BYTES, SESSION_STORE_TTL
+from helpers import cache
+
+
+def _model_size(model):
+    # The site frame dominates, reference tables and cached groups are shared
+    return cache.sizeof(getattr(model, "df", model))
+
+
+# Prepared models of the browser sessions of this process
+models = cache.LRUCache(SESSION_STORE_MAX_BYTES, SESSION_STORE_TTL, _model_size)
+
+
+def new_token():
+    return secrets.token_urlsafe(16)
+
+
+def get(namespace, token):
+    """
+    Returns the model a session stored under a token.
+
+    :param namespace: str - Page owning the model
+    :param token: str - Session token kept in a dcc.Store, may be None
+    :return: The model, or None when it is missing, expired or held by another
+        worker process
+    """
+    if not token:
+        return None
+    return models.get((namespace, token))
+
+
+def put(namespace, token, model):
+    """
+    Stores the model of a session, replacing its previous one.
+
+    :param namespace: str - Page owning the model
+    :param token: str - Session token, a new one is created if None
+    :return: str - The session token to keep in the dcc.Store
+    """
+    token = token or new_token()
+    models.put((namespace, token), model)
+    return token
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+from logger_config import logger
+
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "coalesced": 0}
+
+
+def _count(coalesced):
+    with _stats_lock:
+        _stats["calls"] += 1
+        if coalesced:
+            _stats["coalesced"] += 1
+
+
+def stats():
+    """
+    Returns the coalescing counters of every single-flight group in the process.
+
+    :return: dict - Number of calls and how many of them joined an in-flight call
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls sharing a key across threads: the first caller runs
+    the function and every caller that arrives while it is running waits for and
+    receives the same result (or exception). Results are shared, so callers must
+    not mutate them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        _count(coalesced=not leader)
+
+        if not leader:
+            logger.debug(f"Joining in-flight request for {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent coroutine calls sharing a key on a single event loop.
+    Waiters are shielded, so one cancelled caller does not cancel the shared call.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func, *args, **kwargs):
+        future = self._calls.get(key)
+        _count(coalesced=future is not None)
+        if future is None:
+            future = asyncio.ensure_future(func(*args, **kwargs))
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            logger.debug(f"Joining in-flight request for {key}")
+        return await asyncio.shield(future)
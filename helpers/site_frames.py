@@ -0,0 +1,277 @@
+import threading
+import time
+
+from constants import (
+    API_ENDPOINT,
+    SITE_FRAME_CACHE_MAX_BYTES,
+    SITE_FRAME_CACHE_TTL,
+    SITE_SNAPSHOT_TTL,
+    SNAPSHOT_PERSIST_TTL,
+)
+from helpers import (
+    cache,
+    dataservice_utils,
+    normalizer,
+    parquet_store,
+    site_sync,
+    snapshot_store,
+)
+from logger_config import logger
+
+PREFIX = "sites-"
+
+# Persisted frames are only reused for the same frame layout and data source
+DATA_VERSION = {"schema": normalizer.SCHEMA_VERSION, "api": API_ENDPOINT}
+
+# Normalized site frames of this process, keyed by lower-case commodity name
+frames = cache.LRUCache(SITE_FRAME_CACHE_MAX_BYTES, SITE_FRAME_CACHE_TTL)
+
+
+def snapshot_name(commodity):
+    return f"{PREFIX}{commodity.lower()}"
+
+
+def snapshot_created(commodity):
+    """
+    :return: float - Creation time of the shared snapshot of a commodity, None
+        if there is none
+    """
+    header = snapshot_store.read_header(snapshot_name(commodity))
+    return header["created"] if header else None
+
+
+def _has_fresh_snapshot(commodity):
+    """Checks the age of the shared snapshot from its header, without mapping it"""
+    created = snapshot_created(commodity)
+    return created is not None and time.time() - created < SITE_SNAPSHOT_TTL
+
+
+def _fresh_snapshot(commodity):
+    snapshot = snapshot_store.read_frame(snapshot_name(commodity))
+    if snapshot and snapshot_store.age(snapshot[1]) < SITE_SNAPSHOT_TTL:
+        return snapshot[0]
+    return None
+
+
+def _serving_snapshot(commodity, normalize):
+    """
+    Returns the shared snapshot of a commodity if it can be served: a fresh one,
+    or one restored from its persisted copy after a restart. A restored snapshot
+    older than SITE_SNAPSHOT_TTL is still served, while it is synced with the API
+    in the background.
+
+    :return: pd.DataFrame or None
+    """
+    snapshot = snapshot_store.read_frame(snapshot_name(commodity))
+    if snapshot is None and _restore(commodity):
+        snapshot = snapshot_store.read_frame(snapshot_name(commodity))
+    if snapshot is None:
+        return None
+    df, header = snapshot
+    age = snapshot_store.age(header)
+    if age < SITE_SNAPSHOT_TTL:
+        return df
+    if header["meta"].get("restored") and age < SNAPSHOT_PERSIST_TTL:
+        _resync_in_background(commodity, normalize)
+        return df
+    return None
+
+
+def _restore(commodity):
+    """
+    Copies a persisted frame younger than SNAPSHOT_PERSIST_TTL into the shared
+    snapshot store, keeping its original creation time so it is synced on
+    schedule, and marks it as restored.
+
+    :return: bool - True if a persisted frame was restored
+    """
+    persisted = parquet_store.read_frame(
+        snapshot_name(commodity), DATA_VERSION, SNAPSHOT_PERSIST_TTL
+    )
+    if persisted is None:
+        return False
+    df, stamp = persisted
+    try:
+        snapshot_store.write_frame(
+            snapshot_name(commodity),
+            df,
+            meta={"restored": True},
+            created=stamp["created"],
+        )
+    except OSError as err:
+        logger.warning(f"Failed to restore the site frame of {commodity}: {err}")
+        return False
+    return True
+
+
+def _resync_in_background(commodity, normalize):
+    """Syncs a served stale snapshot in a thread, unless it is already syncing"""
+    lock = snapshot_store.try_refresh_lock(snapshot_name(commodity))
+    if lock is None:
+        return
+    threading.Thread(
+        target=_resync,
+        args=(commodity, normalize, lock),
+        name=f"resync-{commodity.lower()}",
+        daemon=True,
+    ).start()
+
+
+def _resync(commodity, normalize, lock):
+    try:
+        # Another worker may have published it before the lock was taken
+        if not _has_fresh_snapshot(commodity):
+            sync = _sync(commodity, normalize)
+            raw_data = dataservice_utils.fetch_dedup_sites(
+                commodity, ssl_flag=False, params=sync.params()
+            )
+            frames.put(
+                commodity.lower(), _publish(commodity, sync.apply(raw_data), sync)
+            )
+    except Exception as err:
+        logger.warning(f"Failed to resync the site frame of {commodity}: {err}")
+    finally:
+        lock.close()
+
+
+def _persist(commodity, df):
+    """Writes a freshly built frame to Parquet for the next warm start"""
+    try:
+        parquet_store.write_frame(snapshot_name(commodity), df, DATA_VERSION)
+    except Exception as err:
+        logger.warning(f"Failed to persist the site frame of {commodity}: {err}")
+    return df
+
+
+def _publish(commodity, df, sync):
+    df = _persist(commodity, df)
+    try:
+        snapshot_store.write_frame(snapshot_name(commodity), df)
+        shared, header = snapshot_store.read_frame(snapshot_name(commodity))
+        sync.save(header["created"])
+    except OSError as err:
+        # The snapshot directory may be full (e.g. a small /dev/shm), this
+        # process then serves its own copy of the frame
+        logger.warning(f"Failed to share the site frame of {commodity}: {err}")
+        return df
+    return shared
+
+
+def _sync(commodity, normalize):
+    return site_sync.SiteSync(
+        commodity, snapshot_name(commodity), normalize, DATA_VERSION
+    )
+
+
+def warm_start():
+    """
+    Restores every persisted site frame without a fresh snapshot into the shared
+    snapshot store, so the first requests after a restart read local columns
+    instead of waiting for the API.
+    """
+    restored = 0
+    for name in parquet_store.names():
+        if not name.startswith(PREFIX):
+            continue
+        commodity = name[len(PREFIX) :]
+        try:
+            if not _has_fresh_snapshot(commodity) and _restore(commodity):
+                restored += 1
+        except Exception as err:
+            logger.warning(f"Failed to restore the site frame of {commodity}: {err}")
+    if restored:
+        logger.info(f"Restored {restored} persisted site frames")
+
+
+def iter_site_frames(commodities, normalize):
+    """
+    Yields the normalized site frame of every commodity as soon as it is available.
+    Frames cached in this process are yielded first. The others come from the
+    shared snapshot store or, after a restart, from their persisted Parquet copy,
+    which is served even when stale while it is synced in the background. Stale
+    or missing snapshots are synced with the API by whichever worker takes
+    their refresh lock first, while the other workers wait for that snapshot
+    instead of fetching it again.
+
+    :param commodities: list - Commodity names
+    :param normalize: callable - Turns a list of dedup sites into a DataFrame
+    :return: iterator of (index, pd.DataFrame) tuples
+    """
+    missing = []
+    for i, commodity in enumerate(commodities):
+        df = frames.get(commodity.lower())
+        if df is None:
+            missing.append(i)
+        else:
+            yield i, df
+
+    for j, df in _iter_snapshot_frames([commodities[i] for i in missing], normalize):
+        i = missing[j]
+        yield i, frames.put(commodities[i].lower(), df)
+
+
+def _iter_snapshot_frames(commodities, normalize):
+    owned, waiting, locks = [], [], []
+    try:
+        for i, commodity in enumerate(commodities):
+            df = _serving_snapshot(commodity, normalize)
+            if df is not None:
+                yield i, df
+                continue
+
+            lock = snapshot_store.try_refresh_lock(snapshot_name(commodity))
+            if lock is None:
+                waiting.append(i)
+                continue
+            locks.append(lock)
+
+            # Another worker may have published it before the lock was taken
+            df = _fresh_snapshot(commodity)
+            if df is not None:
+                yield i, df
+            else:
+                owned.append(i)
+
+        if owned:
+            syncs = [_sync(commodities[i], normalize) for i in owned]
+            for j, raw_data in dataservice_utils.stream_dedup_sites(
+                [commodities[i] for i in owned],
+                params=[sync.params() for sync in syncs],
+            ):
+                i = owned[j]
+                yield i, _publish(commodities[i], syncs[j].apply(raw_data), syncs[j])
+    finally:
+        for lock in locks:
+            lock.close()
+
+    for i in waiting:
+        yield i, load_site_frame(commodities[i], normalize)
+
+
+def load_site_frame(commodity, normalize):
+    """
+    Returns the normalized site frame of a single commodity, shared by every
+    page of this process until it expires.
+
+    :param commodity: str - Commodity name
+    :param normalize: callable - Turns a list of dedup sites into a DataFrame
+    :return: pd.DataFrame
+    """
+    return frames.get_or_load(commodity.lower(), lambda: _load(commodity, normalize))
+
+
+def _load(commodity, normalize):
+    df = _serving_snapshot(commodity, normalize)
+    if df is not None:
+        return df
+
+    # Only one worker refreshes a snapshot, the others wait and map it
+    with snapshot_store.refresh_lock(snapshot_name(commodity)):
+        df = _fresh_snapshot(commodity)
+        if df is not None:
+            return df
+        sync = _sync(commodity, normalize)
+        raw_data = dataservice_utils.fetch_dedup_sites(
+            commodity, ssl_flag=False, params=sync.params()
+        )
+        return _publish(commodity, sync.apply(raw_data), sync)
@@ -0,0 +1,178 @@
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from constants import DEDUP_MODIFIED_SINCE_PARAM, SITE_FULL_SYNC_INTERVAL
+from helpers import normalizer, reference_data, snapshot_store
+from helpers.json_stream import DIGEST_KEY
+from logger_config import logger
+
+
+def state_name(commodity):
+    return f"sync-{commodity.lower()}"
+
+
+def site_ids(df):
+    """Site ids of a normalized frame, taken from its mineral site URIs"""
+    return df["ms"].str.slice(len(normalizer.MS_URI_PREFIX))
+
+
+class SiteSync:
+    """
+    Incremental refresh of the site frame of one commodity.
+
+    The digest of every site used to build the current frame is kept in a
+    "sync-<commodity>" snapshot. A refresh only normalizes the sites that were
+    added or changed since, drops the removed ones and patches them into the
+    previous frame, keeping the API order so the result is the same as a full
+    rebuild. When DEDUP_MODIFIED_SINCE_PARAM is set, the API is asked only for
+    the sites modified since the last sync watermark, and a full list is fetched
+    every SITE_FULL_SYNC_INTERVAL to pick up removals.
+
+    Anything that invalidates the previous frame (another data version, refreshed
+    reference data, a missing snapshot) falls back to a full rebuild.
+    """
+
+    def __init__(self, commodity, frame_name, normalize, version):
+        """
+        :param commodity: str - Commodity name
+        :param frame_name: str - Snapshot name of the site frame
+        :param normalize: callable - Turns a list of dedup sites into a DataFrame
+        :param version: Data version of the site frame
+        """
+        self.commodity = commodity
+        self.frame_name = frame_name
+        self.normalize = normalize
+        self.version = version
+        self.started = time.time()
+        reference_data.tables()
+        self.reference = reference_data.registry.version
+        self.header = self._usable_header()
+        self.incremental = bool(
+            DEDUP_MODIFIED_SINCE_PARAM
+            and self.header
+            and self.started - self.header["meta"]["full_sync"]
+            < SITE_FULL_SYNC_INTERVAL
+        )
+        self.state = None
+
+    def _usable_header(self):
+        header = snapshot_store.read_header(state_name(self.commodity))
+        frame_header = snapshot_store.read_header(self.frame_name)
+        if header is None or frame_header is None:
+            return None
+        meta = header["meta"]
+        if (
+            meta.get("version") != self.version
+            or meta.get("reference") != self.reference
+            or meta.get("frame_created") != frame_header["created"]
+        ):
+            return None
+        return header
+
+    def params(self):
+        """
+        Extra query parameters of the /dedup-mineral-sites request.
+
+        :return: dict - The modified-since watermark on incremental syncs
+        """
+        if not self.incremental:
+            return {}
+        watermark = datetime.fromtimestamp(
+            self.header["meta"]["watermark"], tz=timezone.utc
+        )
+        return {DEDUP_MODIFIED_SINCE_PARAM: watermark.strftime("%Y-%m-%dT%H:%M:%SZ")}
+
+    def apply(self, sites):
+        """
+        Builds the new site frame from the fetched sites.
+
+        :param sites: list - Projected dedup mineral sites carrying their digests
+        :return: pd.DataFrame
+        """
+        ids = pd.Index([site["id"] for site in sites])
+        digests = np.array([site.get(DIGEST_KEY, 0) for site in sites], np.uint64)
+        previous = snapshot_store.read_frame(self.frame_name) if self.header else None
+        state = snapshot_store.read_frame(state_name(self.commodity))
+        if (
+            previous is None
+            or state is None
+            or "ms" not in previous[0]
+            or not ids.is_unique
+        ):
+            return self._rebuild(sites, ids, digests)
+
+        old_digests = pd.Series(
+            state[0]["digest"].to_numpy(), index=pd.Index(state[0]["id"])
+        )
+        # Digests are positioned through indexers, since reindexing would turn
+        # them into float64 and round them
+        if self.incremental:
+            # Only modified sites were listed, the others are unchanged
+            order = old_digests.index.append(ids.difference(old_digests.index))
+            changed = np.ones(len(ids), dtype=bool)
+            removed = []
+            new_digests = pd.Series(np.zeros(len(order), np.uint64), index=order)
+            new_digests.iloc[: len(old_digests)] = old_digests.to_numpy()
+            new_digests.iloc[order.get_indexer(ids)] = digests
+        else:
+            order = ids
+            positions = old_digests.index.get_indexer(ids)
+            changed = positions < 0
+            known = ~changed
+            changed[known] = old_digests.to_numpy()[positions[known]] != digests[known]
+            removed = old_digests.index.difference(ids)
+            new_digests = pd.Series(digests, index=ids)
+
+        changed_ids = ids[changed]
+        df = previous[0]
+        previous_ids = site_ids(df)
+        kept = df[~(previous_ids.isin(changed_ids) | previous_ids.isin(removed))]
+        delta = self.normalize([site for site, c in zip(sites, changed) if c])
+        if len(delta):
+            # Categories of the delta differ from the kept ones
+            df = normalizer.categorize(pd.concat([kept, delta], ignore_index=True))
+        else:
+            df = kept.reset_index(drop=True)
+
+        # Restore the API order of the sites
+        positions = order.get_indexer(site_ids(df))
+        df = df.iloc[np.argsort(positions, kind="stable")].reset_index(drop=True)
+
+        logger.info(
+            f"Synced {self.commodity}: {len(changed_ids)} added or changed, "
+            f"{len(removed)} removed, {len(order) - len(changed_ids)} unchanged"
+        )
+        self.state = (
+            new_digests.index,
+            new_digests.to_numpy(np.uint64),
+            self.header["meta"]["full_sync"] if self.incremental else self.started,
+        )
+        return df
+
+    def _rebuild(self, sites, ids, digests):
+        self.state = (ids, digests, self.started)
+        return self.normalize(sites)
+
+    def save(self, frame_created):
+        """
+        Stores the digests of the sites behind a published frame.
+
+        :param frame_created: float - Creation time of the published site frame
+        """
+        if self.state is None:
+            return
+        ids, digests, full_sync = self.state
+        snapshot_store.write_frame(
+            state_name(self.commodity),
+            pd.DataFrame({"id": ids.astype(str), "digest": digests}),
+            meta={
+                "version": self.version,
+                "reference": self.reference,
+                "frame_created": frame_created,
+                "watermark": self.started,
+                "full_sync": full_sync,
+            },
+        )
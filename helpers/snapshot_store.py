@@ -0,0 +1,272 @@
+import json
+import os
+import re
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from constants import SNAPSHOT_DIR
+from logger_config import logger
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, refreshes are then not serialized
+    fcntl = None
+
+MAGIC = b"MMSNAP1\n"
+ALIGNMENT = 64
+
+# Null markers of "str" columns, keeping None and NaN apart
+VALID, NONE, NAN = 0, 1, 2
+
+
+def _path(name, directory=SNAPSHOT_DIR):
+    return os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", name) + ".snap")
+
+
+def _is_nan(value):
+    return isinstance(value, float) and value != value
+
+
+def _encode_column(series):
+    """
+    Encodes a column into (spec, buffers). Numeric columns are stored raw,
+    categorical columns as their codes followed by their encoded categories,
+    string columns as one UTF-8 blob with character offsets, anything else as
+    JSON.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        spec, buffers = _encode_column(pd.Series(categories, dtype=categories.dtype))
+        return {
+            "kind": "category",
+            "ordered": bool(series.cat.ordered),
+            "categories": {**spec, "count": len(categories)},
+        }, [series.cat.codes.to_numpy(), *buffers]
+
+    values = series.to_numpy()
+    if values.dtype.kind in "biuf":
+        return {"kind": "numeric", "dtype": values.dtype.str}, [
+            np.ascontiguousarray(values)
+        ]
+
+    nulls = np.zeros(len(values), dtype=np.uint8)
+    strings = []
+    for i, value in enumerate(values):
+        if value is None:
+            nulls[i] = NONE
+            strings.append("")
+        elif _is_nan(value):
+            nulls[i] = NAN
+            strings.append("")
+        elif isinstance(value, str):
+            strings.append(value)
+        else:
+            break
+    else:
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in strings], out=offsets[1:])
+        blob = np.frombuffer("".join(strings).encode("utf-8"), dtype=np.uint8)
+        return {"kind": "str"}, [nulls, offsets, blob]
+
+    blob = "\n".join(json.dumps(value) for value in values).encode("utf-8")
+    return {"kind": "json"}, [np.frombuffer(blob, dtype=np.uint8)]
+
+
+def _decode_column(spec, buffers, rows):
+    if spec["kind"] == "numeric":
+        return buffers[0]  # Zero-copy view into the memory map
+
+    if spec["kind"] == "category":
+        # Only the categories are materialized, the codes stay in the memory map
+        categories = spec["categories"]
+        return pd.Categorical.from_codes(
+            buffers[0],
+            categories=_decode_column(categories, buffers[1:], categories["count"]),
+            ordered=spec["ordered"],
+        )
+
+    if spec["kind"] == "str":
+        nulls, offsets, blob = buffers
+        text = blob.tobytes().decode("utf-8")
+        values = np.empty(rows, dtype=object)
+        values[:] = [text[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+        values[nulls == NONE] = None
+        values[nulls == NAN] = np.nan
+        return values
+
+    values = np.empty(rows, dtype=object)
+    if rows:
+        values[:] = [json.loads(line) for line in buffers[0].tobytes().split(b"\n")]
+    return values
+
+
+def write_frame(name, df, meta=None, directory=SNAPSHOT_DIR, created=None):
+    """
+    Writes a DataFrame snapshot and atomically swaps it in place of the previous
+    one. Readers that still map the old file keep a consistent view of it.
+
+    :param name: str - Snapshot name
+    :param df: pd.DataFrame - Frame to store (its index is not kept)
+    :param meta: dict - Optional JSON serializable metadata such as a data version
+    :param created: float - Creation time of the data, defaults to now
+    """
+    os.makedirs(directory, exist_ok=True)
+    columns, buffers, offset = [], [], 0
+    for column in df.columns:
+        spec, column_buffers = _encode_column(df[column])
+        spec["name"] = column
+        spec["buffers"] = []
+        for buffer in column_buffers:
+            spec["buffers"].append(
+                {"offset": offset, "dtype": buffer.dtype.str, "count": len(buffer)}
+            )
+            buffers.append((offset, buffer))
+            offset += -(-buffer.nbytes // ALIGNMENT) * ALIGNMENT
+        columns.append(spec)
+
+    header = json.dumps(
+        {
+            "rows": len(df),
+            "created": created or time.time(),
+            "meta": meta or {},
+            "columns": columns,
+        }
+    ).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(MAGIC + struct.pack("<Q", len(header)) + header)
+            for buffer_offset, buffer in buffers:
+                file.seek(data_start + buffer_offset)
+                file.write(buffer.tobytes())
+            file.truncate(data_start + offset)
+        os.replace(tmp_path, _path(name, directory))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_header(name, directory=SNAPSHOT_DIR):
+    """
+    Reads only the header of a snapshot.
+
+    :return: dict - Snapshot header or None if there is no snapshot
+    """
+    try:
+        with open(_path(name, directory), "rb") as file:
+            prefix = file.read(len(MAGIC) + 8)
+            if len(prefix) < len(MAGIC) + 8 or not prefix.startswith(MAGIC):
+                return None
+            (header_length,) = struct.unpack("<Q", prefix[len(MAGIC) :])
+            return json.loads(file.read(header_length))
+    except FileNotFoundError:
+        return None
+
+
+def read_frame(name, directory=SNAPSHOT_DIR):
+    """
+    Maps a snapshot into memory. Numeric columns are read-only views of the shared
+    mapping; string columns are materialized.
+
+    :param name: str - Snapshot name
+    :return: tuple - (pd.DataFrame, header dict) or None if there is no snapshot
+    """
+    path = _path(name, directory)
+    try:
+        mapping = np.memmap(path, dtype=np.uint8, mode="r")
+    except (FileNotFoundError, ValueError):
+        return None
+    if mapping[: len(MAGIC)].tobytes() != MAGIC:
+        return None
+
+    (header_length,) = struct.unpack("<Q", mapping[len(MAGIC) : len(MAGIC) + 8])
+    header_end = len(MAGIC) + 8 + header_length
+    header = json.loads(mapping[len(MAGIC) + 8 : header_end].tobytes())
+    data_start = -(-header_end // ALIGNMENT) * ALIGNMENT
+
+    data = {}
+    for spec in header["columns"]:
+        buffers = []
+        for buffer in spec["buffers"]:
+            dtype = np.dtype(buffer["dtype"])
+            start = data_start + buffer["offset"]
+            buffers.append(
+                mapping[start : start + buffer["count"] * dtype.itemsize].view(dtype)
+            )
+        data[spec["name"]] = _decode_column(spec, buffers, header["rows"])
+
+    df = pd.DataFrame(data, index=pd.RangeIndex(header["rows"]), copy=False)
+    return df, header
+
+
+def age(header):
+    """Seconds since a snapshot was written"""
+    return time.time() - header["created"]
+
+
+@contextmanager
+def refresh_lock(name, directory=SNAPSHOT_DIR):
+    """Serializes refreshes of a snapshot across worker processes"""
+    os.makedirs(directory, exist_ok=True)
+    with open(_path(name, directory) + ".lock", "w") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def try_refresh_lock(name, directory=SNAPSHOT_DIR):
+    """
+    Takes the refresh lock of a snapshot without waiting.
+
+    :return: file object holding the lock (close it to release) or None if another
+        process is refreshing the snapshot
+    """
+    os.makedirs(directory, exist_ok=True)
+    lock_file = open(_path(name, directory) + ".lock", "w")
+    if fcntl:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+    return lock_file
+
+
+def load_or_build(name, max_age, build, directory=SNAPSHOT_DIR):
+    """
+    Returns a fresh snapshot, rebuilding it when it is missing or older than
+    max_age. Only one process rebuilds at a time; the others wait and map the
+    snapshot it wrote. A frame that cannot be written is returned unshared.
+
+    :param name: str - Snapshot name
+    :param max_age: float - Maximum snapshot age in seconds
+    :param build: callable - Returns the DataFrame to store
+    :return: pd.DataFrame
+    """
+    snapshot = read_frame(name, directory)
+    if snapshot and age(snapshot[1]) < max_age:
+        return snapshot[0]
+
+    with refresh_lock(name, directory):
+        snapshot = read_frame(name, directory)
+        if snapshot and age(snapshot[1]) < max_age:
+            return snapshot[0]
+        df = build()
+        try:
+            write_frame(name, df, directory=directory)
+        except OSError as err:
+            logger.warning(f"Failed to write snapshot {name}: {err}")
+            return df
+        return read_frame(name, directory)[0]
@@ -1,7 +1,7 @@
-import requests
 import pandas as pd
 import urllib3
 from constants import SPARQL_ENDPOINT
+from helpers import http_client, json_codec
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -32,7 +32,7 @@ def run_sparql_query(query, endpoint=SPARQL_ENDPOINT, values=False):
     {query}
     """
     # send query
-    response = requests.post(
+    response = http_client.post(
         url=endpoint,
         data={"query": final_query},
         headers={
@@ -42,7 +42,7 @@ def run_sparql_query(query, endpoint=SPARQL_ENDPOINT, values=False):
         verify=False,  # Set to False to bypass SSL verification as per the '-k' in curl
     )
     try:
-        qres = response.json()
+        qres = json_codec.loads(response.content)
         if "results" in qres and "bindings" in qres["results"]:
             df = pd.json_normalize(qres["results"]["bindings"])
             if values:
@@ -0,0 +1,359 @@
+import numpy as np
+
+# Earth radius in kms
+EARTH_RADIUS = 6371.0
+
+# Number of pairwise distances computed at once, bounding the temporary memory
+BLOCK_ELEMENTS = 1 << 20
+
+# Smallest grid cell of a SpatialIndex (a chord of about 64 m), keeping cell keys
+# within int64
+MIN_CELL_EDGE = 1e-5
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance between points given in degrees, broadcasting over
+    NumPy arrays.
+
+    :return: np.ndarray - Distances in kms (NaN when a coordinate is missing)
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def _row_blocks(n):
+    """Splits the rows of an n x n distance matrix into memory-bounded blocks"""
+    step = max(1, BLOCK_ELEMENTS // max(n, 1))
+    for start in range(0, n, step):
+        yield start, min(start + step, n)
+
+
+def _upper_block(lat, lon, start, end):
+    """
+    Distances from rows start:end to every later point.
+
+    :return: tuple - (row ids, column ids, distances) of the pairs i < j
+    """
+    rows = np.arange(start, end)[:, None]
+    cols = np.arange(start + 1, len(lat))[None, :]
+    distances = haversine(lat[rows], lon[rows], lat[cols], lon[cols])
+    upper = cols > rows
+    return (
+        np.broadcast_to(rows, upper.shape)[upper],
+        np.broadcast_to(cols, upper.shape)[upper],
+        distances[upper],
+    )
+
+
+def condensed_distances(lat, lon):
+    """
+    All pairwise distances as a condensed upper triangle (the layout of
+    scipy.spatial.distance.pdist): the distance between points i < j is at
+    condensed_index(n, i, j).
+
+    :param lat: array - Latitudes in degrees
+    :param lon: array - Longitudes in degrees
+    :return: np.ndarray - float32 distances in kms
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    n = len(lat)
+    condensed = np.empty(n * (n - 1) // 2, dtype=np.float32)
+    offset = 0
+    for start, end in _row_blocks(n):
+        _, _, distances = _upper_block(lat, lon, start, end)
+        condensed[offset : offset + len(distances)] = distances
+        offset += len(distances)
+    return condensed
+
+
+def condensed_index(n, i, j):
+    """Position of the pair i < j in a condensed distance array of n points"""
+    return n * i - i * (i + 1) // 2 + (j - i - 1)
+
+
+class NeighborList:
+    """
+    The sparse counterpart of a condensed distance array: for every point, the
+    later points (j > i) closer than radius, in increasing j, stored in CSR form.
+    """
+
+    def __init__(self, indptr, indices, distances, radius):
+        self.indptr = indptr
+        self.indices = indices
+        self.distances = distances
+        self.radius = radius
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def neighbors(self, i):
+        """
+        Later points close to point i.
+
+        :return: tuple - (point ids, distances in kms)
+        """
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.distances[start:end]
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.distances.nbytes
+
+
+def _neighbor_list(n, rows, cols, distances, radius):
+    """Builds a NeighborList from unordered pairs of points i < j"""
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return NeighborList(indptr, cols[order], distances[order], radius)
+
+
+def _unit_vectors(lat, lon):
+    """3D coordinates on the unit sphere of points given in degrees"""
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack(
+        (np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)), axis=-1
+    )
+
+
+def _batches(sizes):
+    """Splits consecutive items into batches of about BLOCK_ELEMENTS in total"""
+    ends = np.cumsum(sizes)
+    cuts = np.flatnonzero(np.diff((ends - sizes) // BLOCK_ELEMENTS)) + 1
+    return np.split(np.arange(len(sizes)), cuts)
+
+
+class SpatialIndex:
+    """
+    A uniform grid over the unit-sphere coordinates of points given in degrees.
+
+    Cells are as wide as the chord of cell_size kms, so points closer than that
+    are in the same or in adjacent cells: a radius query only compares a point
+    with the points of the 27 cells around it, and finding every close pair
+    costs about O(n log n + k) for k candidate pairs instead of O(n^2). Points
+    with a missing coordinate are not indexed and have no neighbors.
+    """
+
+    def __init__(self, lat, lon, cell_size):
+        """
+        :param lat: array - Latitudes in degrees
+        :param lon: array - Longitudes in degrees
+        :param cell_size: float - Largest radius that can be queried, in kms
+        """
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cell_size = cell_size
+        self.edge = max(2 * np.sin(cell_size / (2 * EARTH_RADIUS)), MIN_CELL_EDGE)
+        self.width = 2 * int(np.ceil(1 / self.edge)) + 3
+
+        xyz = _unit_vectors(self.lat, self.lon)
+        points = np.flatnonzero(~np.isnan(xyz).any(axis=1))
+        cells = self._cells(xyz[points])
+        order = np.argsort(cells, kind="stable")
+        # Point ids grouped by cell, the cells being sorted by key
+        self.points = points[order]
+        self.keys, self.starts, self.counts = np.unique(
+            cells[order], return_index=True, return_counts=True
+        )
+        steps = np.array([-1, 0, 1])
+        self.offsets = (
+            steps[:, None, None] * self.width**2
+            + steps[None, :, None] * self.width
+            + steps[None, None, :]
+        ).ravel()
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _cells(self, xyz):
+        """Keys of the cells holding unit vectors, a single int64 per cell"""
+        coords = np.floor(xyz / self.edge).astype(np.int64) + self.width // 2
+        return (coords[:, 0] * self.width + coords[:, 1]) * self.width + coords[:, 2]
+
+    def _slots(self, keys):
+        """
+        Positions of cell keys in the index.
+
+        :return: tuple - (positions, mask of the keys that are indexed)
+        """
+        slots = np.searchsorted(self.keys, keys)
+        found = slots < len(self.keys)
+        found[found] = self.keys[slots[found]] == keys[found]
+        return slots, found
+
+    def _check_radius(self, radius):
+        if radius > self.cell_size:
+            raise ValueError(
+                f"Radius {radius} exceeds the cell size {self.cell_size} of the index"
+            )
+
+    def query(self, lat, lon, radius):
+        """
+        Finds the indexed points closer than radius to a point.
+
+        :param lat: float - Latitude in degrees
+        :param lon: float - Longitude in degrees
+        :param radius: float - Search radius in kms, at most cell_size
+        :return: tuple - (sorted point ids, distances in kms)
+        """
+        self._check_radius(radius)
+        xyz = _unit_vectors(np.float64([lat]), np.float64([lon]))
+        if np.isnan(xyz).any():
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        slots, found = self._slots(self._cells(xyz) + self.offsets)
+        ids = np.sort(
+            np.concatenate(
+                [np.empty(0, dtype=np.int64)]
+                + [
+                    self.points[start : start + count]
+                    for start, count in zip(
+                        self.starts[slots[found]], self.counts[slots[found]]
+                    )
+                ]
+            )
+        )
+        distances = haversine(lat, lon, self.lat[ids], self.lon[ids])
+        close = distances < radius
+        return ids[close], distances[close]
+
+    def _cell_pairs(self, cells_a, cells_b):
+        """Every pair of point ids taken from two cells, for each pair of cells"""
+        sizes = self.counts[cells_a] * self.counts[cells_b]
+        pair = np.repeat(np.arange(len(sizes)), sizes)
+        k = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        count_b = self.counts[cells_b][pair]
+        return (
+            self.points[self.starts[cells_a][pair] + k // count_b],
+            self.points[self.starts[cells_b][pair] + k % count_b],
+        )
+
+    def pairs(self, radius):
+        """
+        Finds every pair of indexed points closer than radius.
+
+        :param radius: float - Search radius in kms, at most cell_size
+        :return: NeighborList
+        """
+        self._check_radius(radius)
+        rows, cols, distances = [], [], []
+        for offset in self.offsets:
+            # Each cell against its neighbor at this offset, keeping pairs i < j so
+            # every pair is found once over the 27 offsets
+            slots, found = self._slots(self.keys + offset)
+            cells_a, cells_b = np.flatnonzero(found), slots[found]
+            sizes = self.counts[cells_a] * self.counts[cells_b]
+            for batch in _batches(sizes):
+                a, b = self._cell_pairs(cells_a[batch], cells_b[batch])
+                a, b = a[a < b], b[a < b]
+                d = haversine(self.lat[a], self.lon[a], self.lat[b], self.lon[b])
+                rows.append(a[d < radius])
+                cols.append(b[d < radius])
+                distances.append(d[d < radius])
+
+        empty = [np.empty(0, dtype=np.int64)]
+        return _neighbor_list(
+            len(self),
+            np.concatenate(rows + empty),
+            np.concatenate(cols + empty),
+            np.concatenate(distances + [np.empty(0)]),
+            radius,
+        )
+
+
+def radius_neighbors(lat, lon, radius):
+    """
+    Finds every pair of points closer than radius with a SpatialIndex.
+
+    :param lat: array - Latitudes in degrees
+    :param lon: array - Longitudes in degrees
+    :param radius: float - Search radius in kms
+    :return: NeighborList
+    """
+    return SpatialIndex(lat, lon, radius).pairs(radius)
+
+
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+    from math import atan2, cos, radians, sin, sqrt
+
+    import pandas as pd
+
+    def legacy_distances(df):
+        """The pairwise distance dict formerly built by GradeTonnage"""
+
+        def distance(lat1, lon1, lat2, lon2):
+            lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+            a = (
+                sin((lat2 - lat1) / 2) ** 2
+                + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+            )
+            return EARTH_RADIUS * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+        distances = {}
+        for i in range(len(df)):
+            for j in range(i + 1, len(df)):
+                d = distance(
+                    df.iloc[i]["lat"],
+                    df.iloc[i]["lon"],
+                    df.iloc[j]["lat"],
+                    df.iloc[j]["lon"],
+                )
+                distances[(i, j)] = d
+                distances[(j, i)] = d
+        return distances
+
+    def measure(build, *args):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = build(*args)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result, elapsed, peak
+
+    def sites(n, seed=0):
+        rng = np.random.default_rng(seed)
+        return pd.DataFrame(
+            {"lat": rng.uniform(25, 50, n), "lon": rng.uniform(-125, -65, n)}
+        )
+
+    # The legacy loop is quadratic with a constant cost per pair, so it is timed
+    # on a small sample and extrapolated
+    sample = sites(150)
+    legacy, legacy_time, legacy_peak = measure(legacy_distances, sample)
+    pairs = len(sample) * (len(sample) - 1) // 2
+    time_per_pair, bytes_per_pair = legacy_time / pairs, legacy_peak / pairs
+    condensed = condensed_distances(sample["lat"], sample["lon"])
+    for (i, j), d in legacy.items():
+        if i < j:
+            assert abs(condensed[condensed_index(len(sample), i, j)] - d) < 1e-3
+    del legacy
+
+    print(f"{'n':>6} {'engine':<26} {'time':>10} {'stored':>10} {'peak':>10}")
+    for n in (1_000, 5_000, 20_000):
+        df = sites(n)
+        pairs = n * (n - 1) // 2
+        print(
+            f"{n:>6} {'dict loop (extrapolated)':<26} {time_per_pair * pairs:>9.0f}s "
+            f"{bytes_per_pair * pairs / 2**20:>8.0f}MB {'':>10}"
+        )
+        condensed, elapsed, peak = measure(condensed_distances, df["lat"], df["lon"])
+        print(
+            f"{'':>6} {'condensed float32':<26} {elapsed:>9.2f}s "
+            f"{condensed.nbytes / 2**20:>8.1f}MB {peak / 2**20:>8.1f}MB"
+        )
+        del condensed
+        neighbors, elapsed, peak = measure(
+            radius_neighbors, df["lat"], df["lon"], 100.0
+        )
+        print(
+            f"{'':>6} {'grid index pairs <100km':<26} {elapsed:>9.2f}s "
+            f"{neighbors.nbytes / 2**20:>8.1f}MB {peak / 2**20:>8.1f}MB"
+        )
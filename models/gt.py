@@ -1,55 +1,38 @@
+import os
+import threading
+import time
+
 import pandas as pd
-from helpers import dataservice_utils
-from math import radians, sin, cos, sqrt, atan2
-from functools import lru_cache
+from helpers import (
+    cache,
+    normalizer,
+    process_pool,
+    proximity,
+    reference_data,
+    site_frames,
+    spatial,
+)
 import numpy as np
+from constants import (
+    COMMODITY_GROUPS,
+    GT_CACHE_MAX_BYTES,
+    GT_CACHE_TTL,
+    GT_GROUP_REFRESH_INTERVAL,
+    GT_POOL_MIN_SITES,
+    SITE_SNAPSHOT_TTL,
+)
 from helpers.exceptions import EmptyDedupDataFrame, EmtpyGTDataFrame
-from datetime import datetime, timedelta
-import asyncio
 from helpers.kpis import get_commodity_dict
-from constants import API_ENDPOINT
-
-# Define a constant date range (e.g., 30 days)
-CACHE_DURATION_DAYS = 3
-
-# Cache storage for the last-used timestamps
-cache_access_times = {}
-
-
-# Decorator to create a cache with a time-based expiration
-def lru_cache_with_date_range(maxsize=128):
-    def decorator(func):
-        # LRU Cache
-        @lru_cache(maxsize=maxsize)
-        def wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
-
-        # Function to check and clear outdated cache entries
-        def clear_expired_cache():
-            current_time = datetime.now()
-            for key in list(cache_access_times.keys()):
-                if current_time - cache_access_times[key] > timedelta(
-                    days=CACHE_DURATION_DAYS
-                ):
-                    wrapper.cache_clear()  # Clear the entire cache if one entry is too old
-                    break  # You can modify this to clear only the expired keys if needed
+from logger_config import logger
 
-        # Wrap the original function to track access times
-        def cached_func(*args, **kwargs):
-            clear_expired_cache()  # Check and clear expired cache before any function call
-            result = wrapper(*args, **kwargs)
-            cache_access_times[args] = (
-                datetime.now()
-            )  # Track when the cache was last used
-            return result
+# Largest proximity of the aggregation slider in kms
+MAX_PROXIMITY = 100.0
 
-        return cached_func
+# Proximity groups and aggregated sites shared by every GT model of this process
+results = cache.LRUCache(GT_CACHE_MAX_BYTES, GT_CACHE_TTL)
 
-    return decorator
-
-
-# Earth radius in kms
-EARTH_RADIUS = 6371.0  # in kms
+# Longest wait before preparing a group again after failures, in refresh intervals
+MAX_GROUP_BACKOFF = 8
 
 
 class GradeTonnage:
@@ -60,15 +43,9 @@ class GradeTonnage:
         self.deposit_types = []
         self.country = []
         self.distance_caches = {}
+        self.version = None
         self.proximity_value = proximity_value
-        self.visible_traces = []
-        self.aggregated_df = []
-        self.data_cache = {
-            "countries": {},
-            "deposit-types": {},
-            "states-or-provinces": {},
-            "commodities": {},
-        }
+        self.data_cache = {}
 
     def init(self):
         """Initialize and load data from query path using the function reference"""
@@ -80,157 +57,67 @@ class GradeTonnage:
         #     )
         # )
 
-        self.load_data_cache()
-
-        dataframes = [
-            pd.DataFrame(data)
-            for data in self.clean_and_fix(
-                asyncio.run(
-                    dataservice_utils.fetch_all(
-                        [
-                            ("/dedup-mineral-sites", {"commodity": commodity})
-                            for commodity in self.commodities
-                        ]
-                    )
-                )
-            )
-        ]
-
-        for i, df in enumerate(dataframes):
-            if df.empty:
-                raise EmptyDedupDataFrame(
-                    f"No Data Available for : {self.commodities(i)}"
-                )
-
-        self.df = pd.concat(
-            dataframes,
-            ignore_index=True,
-        )
+        # Shared id -> record lookups for countries, deposit types, etc.
+        self.data_cache = reference_data.tables()
 
-        if self.df.empty:
-            raise EmptyDedupDataFrame("No Data Available")
+        # Commodity groups are served from their prepared frame when ready
+        prepared_groups.start()
+        prepared = prepared_groups.get(self.commodities)
+        if prepared is not None:
+            self.df, self.version, self.distance_caches = prepared
+        else:
+            self.df = self.load_df()
+            # Data version of the cached results derived from this frame
+            self.version = cache.frame_digest(self.df)
 
-        self.df = self.clean_df(self.df)
         self.deposit_types = self.df["top1_deposit_name"].drop_duplicates().to_list()
         self.country = self.df["country"].to_list()
 
-        if self.proximity_value != 0:
-            self.distance_caches = self.compute_all_distances(tuple(self.commodities))
+        if self.proximity_value != 0 and not self.distance_caches:
+            self.distance_caches = self.compute_all_distances()
 
-    def load_data_cache(self):
-        data_list = sorted(self.data_cache.keys())
+    def load_df(self):
+        """
+        Loads and cleans the site frames of the selected commodities.
 
-        data_results = asyncio.run(
-            dataservice_utils.fetch_all([("/" + url, None) for url in data_list])
+        :return: pd.DataFrame
+        """
+        # Each commodity frame is checked as soon as it is available
+        dataframes = [None] * len(self.commodities)
+        for i, df in site_frames.iter_site_frames(self.commodities, self.normalize):
+            dataframes[i] = df
+            if dataframes[i].empty:
+                raise EmptyDedupDataFrame(
+                    f"No Data Available for : {self.commodities[i]}"
+                )
+
+        # Sites are grouped in row order, so the frames are concatenated in a
+        # fixed commodity order whatever the order of the selection
+        df = normalizer.categorize(
+            pd.concat(
+                [dataframes[i] for i in np.argsort(self.commodities, kind="stable")],
+                ignore_index=True,
+            )
         )
 
-        for i in range(len(data_list)):
-            for data in data_results[i]:
-                q_key = data["uri"].split("/")[-1]
-                self.data_cache[data_list[i]][q_key] = data
+        if df.empty:
+            raise EmptyDedupDataFrame("No Data Available")
+
+        return self.clean_df(df)
 
     def update_commodity(self, selected_commodities):
         """sets new commodity"""
         self.commodities = [
             selected_commodity.lower() for selected_commodity in selected_commodities
         ]
-        self.visible_traces = []
-        self.aggregated_df = []
 
     def update_proximity(self, proximity_value):
         """sets new proximity"""
         self.proximity_value = proximity_value
 
-    def clean_and_fix(self, raw_data_list):
-        result_list = []
-        for raw_data in raw_data_list:
-            results = []
-            for data in raw_data:
-
-                if len(data["deposit_types"]) == 0:
-                    continue
-
-                combined_data = {}
-                combined_data["ms"] = "/".join(
-                    [API_ENDPOINT.split("/api")[0], "derived", data["id"]]
-                )
-                combined_data["ms_name"] = data["name"]
-                combined_data["ms_type"] = data["type"]
-                combined_data["ms_rank"] = data["rank"]
-
-                # Location details
-                if (
-                    "location" in data
-                    and "country" in data["location"]
-                    and data["location"]["country"]
-                    and data["location"]["country"][0] in self.data_cache["countries"]
-                ):
-                    combined_data["country"] = self.data_cache["countries"][
-                        data["location"]["country"][0]
-                    ]["name"]
-                else:
-                    combined_data["country"] = None
-
-                if (
-                    "location" in data
-                    and "state_or_province" in data["location"]
-                    and data["location"]["state_or_province"]
-                    and data["location"]["state_or_province"][0]
-                    in self.data_cache["states-or-provinces"]
-                ):
-                    combined_data["state_or_province"] = self.data_cache[
-                        "states-or-provinces"
-                    ][data["location"]["state_or_province"][0]]["name"]
-                else:
-                    combined_data["state_or_province"] = None
-
-                if "location" in data:
-                    combined_data["lat"] = data["location"].get("lat", None)
-                    combined_data["lon"] = data["location"].get("lon", None)
-
-                # Deposit Type details
-                highest_confidence_deposit = max(
-                    data["deposit_types"], key=lambda x: x["confidence"]
-                )
-
-                deposit_details = self.data_cache["deposit-types"].get(
-                    highest_confidence_deposit["id"], None
-                )
-
-                if not deposit_details:
-                    continue
-                combined_data["top1_deposit_name"] = deposit_details["name"]
-                combined_data["top1_deposit_group"] = deposit_details["group"]
-                combined_data["top1_deposit_environment"] = deposit_details[
-                    "environment"
-                ]
-                combined_data["top1_deposit_confidence"] = highest_confidence_deposit[
-                    "confidence"
-                ]
-                combined_data["top1_deposit_source"] = highest_confidence_deposit[
-                    "source"
-                ]
-
-                # Commodity details
-                combined_data["commodity"] = data["grade_tonnage"][0]["commodity"]
-
-                # GT details
-                if "total_grade" in data["grade_tonnage"][0]:
-                    combined_data["total_grade"] = data["grade_tonnage"][0]["total_grade"]
-                    combined_data["total_tonnage"] = data["grade_tonnage"][0]["total_tonnage"]
-                    combined_data["total_contained_metal"] = data["grade_tonnage"][0][
-                        "total_contained_metal"
-                    ]
-
-                # Setting Unkown Deposit Types
-                if not combined_data.get("total_tonnage") or not combined_data.get(
-                    "total_grade"
-                ):
-                    combined_data["top1_deposit_name"] = "Unknown"
-
-                results.append(combined_data)
-            result_list.append(results)
-        return result_list
+    def normalize(self, raw_data):
+        """Builds the site frame of a dedup mineral sites payload"""
+        return normalizer.normalize_sites(raw_data, self.data_cache)
 
     def clean_df(self, df):
         """A cleaner method to clean the raw data obtained from the SPARQL endpoint"""
@@ -254,36 +141,67 @@ class GradeTonnage:
 
         return df
 
-    # Haversine distance function to calculate distance in miles
-    def haversine(self, lat1, lon1, lat2, lon2):
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-
-        a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-
-        return EARTH_RADIUS * c  # Returns distance in miles
-
-    # Caching approach: Precompute all pairwise distances and store them
-    @lru_cache_with_date_range(maxsize=10)
-    def compute_all_distances(self, commodities):
-        distances = {}
-        num_points = len(self.df)
-
-        # Compare each point with every other point and store distances
-        for i in range(num_points):
-            for j in range(i + 1, num_points):
-                distance = self.haversine(
-                    self.df.iloc[i]["lat"],
-                    self.df.iloc[i]["lon"],
-                    self.df.iloc[j]["lat"],
-                    self.df.iloc[j]["lon"],
-                )
-                distances[(i, j)] = distance
-                distances[(j, i)] = distance  # Symmetric distances
+    @property
+    def cache_key(self):
+        """Key of the results derived from the sites of this commodity selection"""
+        return tuple(sorted(self.commodities)), self.version
+
+    def compute_all_distances(self):
+        """
+        Finds the sites of each deposit type closer than MAX_PROXIMITY, so any
+        slider value can be aggregated without computing distances again. The
+        result is shared by every model of the same sites.
+
+        :return: dict - proximity.ProximityGroups of every deposit type, indexed
+            by position within the sites of that type
+        """
+        return results.get_or_load(
+            ("proximity", *self.cache_key), self._build_proximity_groups
+        )
 
-        return distances
+    def _build_proximity_groups(self):
+        # The sites are laid out by deposit type so each one is a slice, and large
+        # selections build the slices in the process pool
+        codes, d_types = pd.factorize(self.df["top1_deposit_name"])
+        order = np.argsort(codes, kind="stable")
+        order = order[codes[order] >= 0]
+        ends = np.cumsum(np.bincount(codes[codes >= 0], minlength=len(d_types)))
+        tasks = [
+            (int(end - count), int(end), MAX_PROXIMITY)
+            for end, count in zip(ends, np.diff(ends, prepend=0))
+        ]
+        groups = process_pool.map_shared(
+            proximity.build_groups,
+            {
+                "lat": self.df["lat"].to_numpy(np.float64)[order],
+                "lon": self.df["lon"].to_numpy(np.float64)[order],
+            },
+            tasks,
+            parallel=len(order) >= GT_POOL_MIN_SITES,
+        )
+        return dict(zip(d_types, groups))
+
+    def aggregate(self, d_type, df, proximity_value):
+        """
+        Greedily groups the sites of a deposit type closer than proximity_value
+        to the first ungrouped site, in row order, and aggregates each group.
+
+        :param d_type: str - Deposit type
+        :param df: pd.DataFrame - Sites of that deposit type in self.df
+        :param proximity_value: float - Grouping distance in kms
+        :return: pd.DataFrame - One row per group, shared with other models
+        """
+        if d_type not in self.distance_caches:
+            self.distance_caches = self.compute_all_distances()
+        groups = self.distance_caches.get(d_type)
+        if groups is None or groups.radius < proximity_value:
+            groups = proximity.ProximityGroups(
+                spatial.radius_neighbors(df["lat"], df["lon"], proximity_value)
+            )
+        return results.get_or_load(
+            ("aggregation", *self.cache_key, d_type, proximity_value),
+            lambda: proximity.aggregate(df, groups.labels(proximity_value)),
+        )
 
     def extract_lat_lon(self, wkt_point):
         if pd.isnull(wkt_point):
@@ -292,3 +210,145 @@ class GradeTonnage:
         wkt_point = wkt_point.replace("POINT (", "").replace(")", "")
         lon, lat = map(float, wkt_point.split())
         return pd.Series([lat, lon])
+
+
+class PreparedGroups:
+    """
+    GT frames of the commodity groups (REE, PGE, ...) with the proximity groups
+    of their deposit types, built once per process. A background thread checks
+    the shared site snapshots of the members every interval seconds, and only
+    rebuilds a group when one of them was published again or went stale, so
+    only the worker holding its refresh lock fetches it. Members without a
+    shared snapshot are compared by the digest of their frame in this process,
+    and a group whose build failed waits longer after every failure. Selecting exactly the
+    members of a group is then served from memory, without loading, cleaning or
+    indexing its sites.
+    """
+
+    def __init__(self, groups, interval):
+        """
+        :param groups: dict - Member commodities of every group name
+        :param interval: float - Seconds between two checks of the snapshots
+        """
+        self.groups = groups
+        self.interval = interval
+        self._prepared = {}  # sorted members -> (df, version, proximity groups)
+        self._sources = {}  # sorted members -> member sources of a build
+        self._failures = {}  # sorted members -> (failed builds, next attempt time)
+        self._lock = threading.Lock()
+        self._refresher_pid = None
+
+    @staticmethod
+    def _key(commodities):
+        return tuple(sorted(set(commodity.lower() for commodity in commodities)))
+
+    def get(self, commodities):
+        """
+        :return: tuple - (df, version, proximity groups) of the group of exactly
+            these commodities, None if it is not a group or not prepared yet
+        """
+        return self._prepared.get(self._key(commodities))
+
+    def build(self, members):
+        """Prepares the frame of a group, reusing it when its sites are unchanged"""
+        gt = GradeTonnage(self._key(members))
+        gt.data_cache = reference_data.tables()
+        gt.df = gt.load_df()
+        gt.version = cache.frame_digest(gt.df)
+        previous = self._prepared.get(self._key(members))
+        if previous is not None and previous[1] == gt.version:
+            return previous
+        return gt.df, gt.version, gt.compute_all_distances()
+
+    @staticmethod
+    def _source(member):
+        """
+        :return: tuple - ("snapshot", creation time) of the shared snapshot of a
+            member or, without one, ("frame", digest) of the frame cached in this
+            process, None if there is neither
+        """
+        created = site_frames.snapshot_created(member)
+        if created is not None:
+            return "snapshot", created
+        df = site_frames.frames.get(member)
+        if df is not None:
+            return "frame", cache.frame_digest(df)
+        return None
+
+    def _sources_of(self, key):
+        return tuple(self._source(member) for member in key)
+
+    def _outdated(self, key):
+        """
+        :return: tuple - (member, source) of the members whose snapshot or local
+            frame changed since the group was built, or is missing or stale,
+            empty if the group is up to date
+        """
+        built = self._sources.get(key, (None,) * len(key))
+        return tuple(
+            (member, source)
+            for member, source, previous in zip(key, self._sources_of(key), built)
+            if source is None
+            or source != previous
+            or source[0] == "snapshot"
+            and time.time() - source[1] >= SITE_SNAPSHOT_TTL
+        )
+
+    def _failed(self, key):
+        """Delays the next build of a group, twice as long after every failure"""
+        failures = self._failures.get(key, (0, None))[0] + 1
+        delay = self.interval * min(2**failures, MAX_GROUP_BACKOFF)
+        self._failures[key] = failures, time.time() + delay
+
+    def refresh(self):
+        """Rebuilds the groups whose member snapshots changed, returns their names"""
+        rebuilt = []
+        for name, members in self.groups.items():
+            key = self._key(members)
+            if time.time() < self._failures.get(key, (0, 0.0))[1]:
+                continue
+            outdated = self._outdated(key)
+            if key in self._prepared and not outdated:
+                continue
+            try:
+                # Frames cached in this process may predate the new snapshots,
+                # a frame without a snapshot is already the newest one
+                for member, source in outdated:
+                    if source is not None and source[0] == "snapshot":
+                        site_frames.frames.invalidate(member)
+                self._prepared[key] = self.build(members)
+                self._sources[key] = self._sources_of(key)
+                self._failures.pop(key, None)
+                rebuilt.append(name)
+            except Exception as err:
+                self._failed(key)
+                logger.warning(f"Failed to prepare the {name} GT frame: {err}")
+        return rebuilt
+
+    def start(self):
+        """Prepares every group in a background thread of this process"""
+        pid = os.getpid()
+        if self._refresher_pid == pid:
+            return
+        with self._lock:
+            if self._refresher_pid != pid:
+                self._refresher_pid = pid
+                threading.Thread(
+                    target=self._refresh_forever,
+                    name="minmod-gt-groups",
+                    daemon=True,
+                ).start()
+
+    def _refresh_forever(self):
+        while True:
+            started = time.time()
+            rebuilt = self.refresh()
+            if rebuilt:
+                logger.info(
+                    f"Prepared GT frames of {', '.join(rebuilt)} in"
+                    f" {time.time() - started:.1f}s"
+                )
+            time.sleep(self.interval)
+
+
+prepared_groups = PreparedGroups(COMMODITY_GROUPS, GT_GROUP_REFRESH_INTERVAL)
@@ -1,18 +1,22 @@
 import dash
-from dash import html, callback, clientside_callback, dcc
+from dash import html, callback, clientside_callback, ctx, dcc
 import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State
 import pandas as pd
 from helpers import kpis
-from components import get_gt_model
+from components import get_gt_model, get_gt_model_patch, point_uris
+from helpers import point_index, result_store, session_store
 from models import GradeTonnage
-import json
 from helpers.exceptions import MinModException
+from logger_config import logger
 from constants import ree_minerals, heavy_ree_minerals, light_ree_minerals, pge_minerals
 
 min_distance, max_distance = 0.1, 100
 marks = {0.1: "100m", 5: "5km", 20: "20km", 100: "100km"}
 
+# Namespace of the GradeTonnage models in the session store
+SESSION_NAMESPACE = "gtmodel"
+
 dash.register_page(__name__, path="/gtmodel")
 
 layout = html.Div(
@@ -140,14 +144,27 @@ layout = html.Div(
             },
         ),
         dcc.Store(id="gt-agg-data"),
-        dcc.Store(id="gt-df-data"),
         dcc.Store(id="select-commodity-data"),
+        dcc.Store(id="gt-model-token", storage_type="session"),
+        dcc.Store(id="gt-hidden-traces"),
         html.Div(id="url", style={"display": "none"}),
         html.Div(id="url-div", style={"display": "none"}),  # Dummy div
     ],
 )
 
 
+def gt_result(gt, aggregated):
+    """
+    Result of a render kept in the result store: the frames of the traces, and
+    the key of the URI index of the point ids carried in their customdata. The
+    index only changes with the data version, so it is stored once per version.
+    """
+    return {
+        "frames": aggregated,
+        "uris": result_store.put_shared(("uris", gt.version), lambda: point_uris(gt)),
+    }
+
+
 @callback(
     Output("commodity-gt", "options"),
     Input(
@@ -193,24 +210,31 @@ def toggle_slider_and_download(figure):
 @callback(
     [
         Output("gt-agg-data", "agg_data"),
-        Output("gt-df-data", "df_data"),
         Output("select-commodity-data", "commodity_data"),
         Output("render-plot", "children"),
         Output("commodity-gt", "value"),
+        Output("gt-model-token", "data"),
+        Output("clickable-plot", "figure"),
     ],
     [
         Input("commodity-gt", "value"),
         Input("aggregation-slider", "value"),  # Add slider as input
-        State("clickable-plot", "figure"),
+        State("gt-model-token", "data"),
+        State("gt-agg-data", "agg_data"),
+        State("gt-hidden-traces", "data"),
     ],
     prevent_initial_call=True,
 )
-def update_output(selected_commodities, proximity_value, figure):
-    """A callback to render grade tonnage model based on the commodity selected and proximity value"""
+def update_output(selected_commodities, proximity_value, token, agg_key, hidden_traces):
+    """
+    A callback to render grade tonnage model based on the commodity selected and proximity value.
+    Slider moves on the model of the session only patch the points of the rendered plot, which
+    keeps its layout and legend state in the browser. Full renders hide the deposit types hidden
+    in the legend of the previous plot.
+    """
 
     if not selected_commodities:
         return (
-            None,
             None,
             None,
             [
@@ -223,6 +247,8 @@ def update_output(selected_commodities, proximity_value, figure):
                 ),
             ],
             [],
+            dash.no_update,
+            dash.no_update,
         )
 
     if "REE" in selected_commodities:
@@ -236,25 +262,40 @@ def update_output(selected_commodities, proximity_value, figure):
     if "LIGHT-REE" in selected_commodities:
         selected_commodities.remove("LIGHT-REE")
         selected_commodities = list(set(selected_commodities + light_ree_minerals))
-    
+
     if "PGE" in selected_commodities:
         selected_commodities.remove("PGE")
         selected_commodities = list(set(selected_commodities + pge_minerals))
 
     try:
-        gt = GradeTonnage(selected_commodities, proximity_value)
-        gt.init()
-        if proximity_value != 0:
-            visible_traces = [
-                " ".join(trace["name"].split()[:-1])
-                for trace in figure["data"]
-                if "hovertemplate" in trace and trace.get("visible", True) == True
-            ]
-            gt.visible_traces = visible_traces
+        # The prepared model of the session is reused while the selection is
+        # unchanged, so slider moves only aggregate and render again. Concurrent
+        # callbacks of the session share it, so it is only read from here on
+        gt = session_store.get(SESSION_NAMESPACE, token)
+        if gt is not None and sorted(gt.commodities) == sorted(
+            commodity.lower() for commodity in selected_commodities
+        ):
+            if ctx.triggered_prop_ids.keys() == {"aggregation-slider.value"}:
+                # Only the traces that changed since the rendered result are sent
+                previous = result_store.get(agg_key)
+                aggregated, gt_model_patch = get_gt_model_patch(
+                    gt, proximity_value, previous and previous["frames"]
+                )
+                return (
+                    result_store.put(gt_result(gt, aggregated), agg_key),
+                    dash.no_update,
+                    dash.no_update,
+                    dash.no_update,
+                    dash.no_update,
+                    gt_model_patch,
+                )
+        else:
+            gt = GradeTonnage(selected_commodities, proximity_value)
+            gt.init()
+            token = session_store.put(SESSION_NAMESPACE, token, gt)
 
     except MinModException as e:
         return (
-            None,
             None,
             selected_commodities,
             [
@@ -271,11 +312,12 @@ def update_output(selected_commodities, proximity_value, figure):
                 ),
             ],
             selected_commodities,
+            dash.no_update,
+            dash.no_update,
         )
 
     except Exception as e:
         return (
-            None,
             None,
             selected_commodities,
             [
@@ -292,14 +334,13 @@ def update_output(selected_commodities, proximity_value, figure):
                 ),
             ],
             selected_commodities,
+            dash.no_update,
+            dash.no_update,
         )
 
-    gt, gt_model_plot = get_gt_model(gt, proximity_value)
+    aggregated, gt_model_plot = get_gt_model(gt, proximity_value, hidden_traces or ())
     return (
-        json.dumps(
-            [df.to_json(date_format="iso", orient="split") for df in gt.aggregated_df]
-        ),
-        gt.df.to_json(date_format="iso", orient="split"),
+        result_store.put(gt_result(gt, aggregated), agg_key),
         selected_commodities,
         [
             dbc.Card(
@@ -328,6 +369,8 @@ def update_output(selected_commodities, proximity_value, figure):
             )
         ],
         selected_commodities,
+        token,
+        dash.no_update,
     )
 
 
@@ -335,18 +378,42 @@ def update_output(selected_commodities, proximity_value, figure):
     Output("url", "children"),
     Output("clickable-plot", "clickData"),
     Input("clickable-plot", "clickData"),
-    State("gt-df-data", "df_data"),  # Use as state
+    State("gt-agg-data", "agg_data"),
     prevent_initial_call=True,
 )
-def open_url(clickData, df_data):
+def open_url(clickData, agg_data):
     """A callback to open the clicked url on a new tab"""
-    if not df_data:  # Safeguard against unnecessary execution
+    if not clickData or "customdata" not in clickData["points"][0]:
         raise dash.exceptions.PreventUpdate
-    df_data = pd.read_json(df_data, orient="split")
-    if clickData:
-        filtered_df = df_data[df_data["ms_name"] == clickData["points"][0]["text"]]
-        return filtered_df["ms"].tolist()[0], None
-    return None, None
+    result = result_store.get(agg_data)
+    uris = result and result_store.get(result["uris"])
+    if uris is None:
+        raise dash.exceptions.PreventUpdate
+    # The point carries its id, the first site of an aggregated point is opened
+    uri = point_index.lookup(uris, clickData["points"][0]["customdata"][1])
+    if uri is None:
+        raise dash.exceptions.PreventUpdate
+    return uri, None
+
+
+# Clientside function keeping the deposit types hidden in the legend, so a full
+# render keeps them hidden without sending the figure to the server
+clientside_callback(
+    """
+    function(restyleData, figure) {
+        if (!figure || !figure.data) {
+            return window.dash_clientside.no_update;
+        }
+        return figure.data
+            .filter(trace => trace.showlegend !== false && trace.visible === "legendonly")
+            .map(trace => trace.name.split(" ").slice(0, -1).join(" "));
+    }
+    """,
+    Output("gt-hidden-traces", "data"),
+    Input("clickable-plot", "restyleData"),
+    State("clickable-plot", "figure"),
+    prevent_initial_call=True,
+)
 
 
 # Clientside function to open a new tab
@@ -369,11 +436,11 @@ clientside_callback(
     Input("download-btn", "n_clicks"),  # Trigger the callback only on button click
     [
         State("gt-agg-data", "agg_data"),  # Use as state
-        State("clickable-plot", "figure"),  # Use as state
+        State("gt-hidden-traces", "data"),  # Use as state
     ],
     prevent_initial_call=True,  # Ensures the callback does not run on page load
 )
-def download_csv(n_clicks, agg_data, figure):
+def download_csv(n_clicks, agg_data, hidden_traces):
     """Callback to generate CSV data for download only when the button is clicked"""
     if not n_clicks:  # Safeguard against unnecessary execution
         raise dash.exceptions.PreventUpdate
@@ -381,14 +448,14 @@ def download_csv(n_clicks, agg_data, figure):
     if not agg_data:  # Safeguard against unnecessary execution
         raise dash.exceptions.PreventUpdate
 
-    if not figure:  # Safeguard against unnecessary execution
-        raise dash.exceptions.PreventUpdate
-
     # Parse and aggregate data
     try:
-        aggregated_df = [
-            pd.read_json(dt, orient="split") for dt in json.loads(agg_data)
-        ]
+        # The aggregated frames are kept on the server, the store only holds their key
+        result = result_store.get(agg_data)
+        if result is None:
+            logger.warning(f"Result {agg_data} expired, nothing to download")
+            raise dash.exceptions.PreventUpdate
+        aggregated_df = result["frames"]
         df = pd.concat(aggregated_df, ignore_index=True)[
             [
                 "ms",
@@ -413,13 +480,8 @@ def download_csv(n_clicks, agg_data, figure):
             "Total Grade(Percent)",
         ]
 
-        # Filter by visible traces
-        visible_traces = [
-            " ".join(trace["name"].split()[:-1])
-            for trace in figure["data"]
-            if "hovertemplate" in trace and trace.get("visible", True) == True
-        ]
-        df = df[df["top1_deposit_name"].isin(visible_traces)]
+        # Leave out the deposit types hidden in the legend
+        df = df[~df["top1_deposit_name"].isin(hidden_traces or [])]
 
         # Clean up column data
         df["ms_name"] = df["ms_name"].apply(
@@ -434,11 +496,13 @@ def download_csv(n_clicks, agg_data, figure):
 
         # Check if DataFrame is empty
         if df.empty:
-            print("No data available to download.")
+            logger.warning("No data available to download")
             raise dash.exceptions.PreventUpdate
 
         # Generate CSV data for download
         return dcc.send_data_frame(df.to_csv, "gt_data.csv")
+    except dash.exceptions.PreventUpdate:
+        raise
     except Exception as e:
-        print(f"Error generating CSV: {e}")
+        logger.error(f"Error generating CSV: {e}")
         raise dash.exceptions.PreventUpdate
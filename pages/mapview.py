@@ -4,10 +4,16 @@ import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State
 import pandas as pd
 import dash
-from components import stats_card, pie_card, geo_model_card
+from components import (
+    stats_card,
+    pie_card,
+    geo_model_card,
+    map_style_patch,
+    plotted_sites,
+)
 from helpers import kpis
 from models import GeoMineral
-from helpers import sparql_utils
+from helpers import point_index, result_store, sparql_utils
 import time
 from dash import callback_context
 from dash.exceptions import PreventUpdate
@@ -89,6 +95,8 @@ def render():
                 ],
                 align="start",
             ),
+            # Key of the URI of every point id of the rendered map, in result_store
+            dcc.Store(id="geo-point-index"),
             html.Div(id="url-geo", style={"display": "none"}),
             # Dummy div to satisfy Dash callback requirements
             html.Div(id="url-div-geo", style={"display": "none"}),
@@ -121,31 +129,58 @@ def set_default_commodity(options):
     Output("url-geo", "children"),
     Output("clickable-geo-plot", "clickData"),
     Input("clickable-geo-plot", "clickData"),
+    State("geo-point-index", "data"),
     prevent_initial_call=True,
 )
-def open_url(clickData):
+def open_url(clickData, index_key):
     """A callback to handle geo map plot based on the user click"""
-    if clickData:
-        clicked_dict = clickData["points"][0]
-        filtered_df = gm.gdf[
-            (gm.gdf["lat"] == clicked_dict["lat"])
-            & (gm.gdf["lon"] == clicked_dict["lon"])
-        ]
-        return filtered_df["ms"].tolist()[0], None
+    uris = result_store.get(index_key)
+    if uris is not None and clickData and "customdata" in clickData["points"][0]:
+        # The point id is its row in the plotted frame of this session's render
+        uri = point_index.lookup(uris, clickData["points"][0]["customdata"])
+        if uri is not None:
+            return uri, None
     return None, None
 
 
+def render_geo_model(theme, index_key):
+    """
+    Renders the map of gm and stores the URI of every point id it shows.
+
+    :param theme: str - light or dark
+    :param index_key: str - Key of the index of the previous render, which is replaced
+    :return: The map card and the key of its index
+    """
+    # Other sessions may replace gm.df, so the figure and the index are built
+    # from the same frame
+    sites = plotted_sites(gm.df)
+    return (
+        geo_model_card(gm, theme, sites),
+        result_store.put(sites["ms"].to_numpy(object), index_key),
+    )
+
+
 @callback(
-    [Output("theme-toggle-button", "children"), Output("render-geo-plot", "children")],
+    [
+        Output("theme-toggle-button", "children"),
+        Output("render-geo-plot", "children"),
+        Output("clickable-geo-plot", "figure"),
+        Output("geo-point-index", "data"),
+    ],
     [Input("theme-toggle-button", "n_clicks"), Input("commodity-main-geo", "value")],
     [
         State("theme-toggle-button", "children"),
-        State("render-geo-plot", "children"),
         State("theme-toggle-button", "n_clicks"),
+        State("geo-point-index", "data"),
     ],
 )
-def update_ui(n_clicks_theme, selected_commodity, current_icon, _, n_clicks_previous):
-    """A callback to handle map theme and render map based on the commodity selected"""
+def update_ui(
+    n_clicks_theme, selected_commodity, current_icon, n_clicks_previous, index_key
+):
+    """
+    A callback to handle map theme and render map based on the commodity selected.
+    Theme toggles only patch the base map of the rendered plot.
+    """
     # Initial state when no button has been clicked yet
     if n_clicks_theme is None:
         n_clicks_theme = 0
@@ -162,18 +197,19 @@ def update_ui(n_clicks_theme, selected_commodity, current_icon, _, n_clicks_prev
         new_class = "fas fa-moon" if is_dark else "fas fa-sun"
         return [
             html.I(" Toggle Map View", className=new_class),
-            geo_model_card(gm, new_theme),
+            dash.no_update,
+            map_style_patch(new_theme),
+            dash.no_update,
         ]
     elif trigger_id == "commodity-main-geo":
         # Maintain the theme based on the last button click count
         is_dark = n_clicks_previous % 2 == 1
         current_theme = "dark" if is_dark else "light"
-        if selected_commodity == gm.commodity:
-            return [current_icon, geo_model_card(gm, current_theme)]
-        selected_commodity = selected_commodity.split()[0]
-        gm.update_commodity(selected_commodity)
-        gm.init()
-        return [current_icon, geo_model_card(gm, current_theme)]
+        if selected_commodity != gm.commodity:
+            gm.update_commodity(selected_commodity.split()[0])
+            gm.init()
+        card, index_key = render_geo_model(current_theme, index_key)
+        return [current_icon, card, dash.no_update, index_key]
     else:
         raise PreventUpdate
 
@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from plotly.io.json import to_json_plotly
+
+from components.cards.geo_map import map_style_patch
+from components.cards.gt_model import get_gt_model, get_gt_model_patch
+from helpers import normalizer, proximity, spatial
+
+# Budgets of the serialized Patch responses, in bytes
+THEME_PATCH_BUDGET = 1024
+EMPTY_PATCH_BUDGET = 128
+SLIDER_PATCH_BUDGET = 64 * 1024
+
+
+def payload(patch):
+    return len(to_json_plotly(patch.to_plotly_json()))
+
+
+def patched_traces(patch):
+    return {
+        operation["location"][1] for operation in patch.to_plotly_json()["operations"]
+    }
+
+
+@pytest.fixture(scope="module")
+def gt():
+    """
+    A grade-tonnage model of 2000 sites in 20 deposit types. The sites of the
+    first 10 types are packed in a one degree box, the others spread worldwide.
+    """
+    rng = np.random.default_rng(0)
+    n = 2000
+    d_type = np.arange(n) % 20
+    packed = d_type < 10
+    df = pd.DataFrame(
+        {
+            "top1_deposit_name": [f"Type {i:02d}" for i in d_type],
+            "total_tonnage": rng.lognormal(0, 2, n),
+            "total_grade": rng.lognormal(0, 1, n),
+            "ms_name": [f"Site {i}" for i in range(n)],
+            "ms": [f"https://minmod.isi.edu/resource/site{i}" for i in range(n)],
+            "commodity": "Q589",
+            "lat": np.where(packed, rng.uniform(40, 41, n), rng.uniform(-60, 60, n)),
+            "lon": np.where(
+                packed, rng.uniform(-100, -99, n), rng.uniform(-180, 180, n)
+            ),
+        }
+    )
+    df["total_contained_metal"] = df["total_tonnage"] * df["total_grade"] / 100
+    # Like a cleaned site frame, whose "Unknown" sites were filtered out
+    df = normalizer.categorize(df)
+    df["top1_deposit_name"] = df["top1_deposit_name"].cat.add_categories("Unknown")
+
+    def aggregate(d_type, df, proximity_value):
+        groups = proximity.ProximityGroups(
+            spatial.radius_neighbors(df["lat"], df["lon"], proximity_value)
+        )
+        return proximity.aggregate(df, groups.labels(proximity_value))
+
+    return SimpleNamespace(
+        df=df,
+        commodities=["copper"],
+        data_cache={"commodities": {"Q589": {"name": "Copper"}}},
+        aggregate=aggregate,
+    )
+
+
+@pytest.mark.parametrize("theme", ["light", "dark"])
+def test_theme_patch_payload(theme):
+    assert payload(map_style_patch(theme)) <= THEME_PATCH_BUDGET
+
+
+def test_slider_patch_payload(gt):
+    previous, figure = get_gt_model(gt, 0)
+    _, patch = get_gt_model_patch(gt, 20, previous)
+
+    assert payload(patch) <= SLIDER_PATCH_BUDGET
+    assert payload(patch) < len(to_json_plotly(figure)) / 2
+
+
+def test_slider_patch_sends_changed_traces_only(gt):
+    previous, figure = get_gt_model(gt, 0)
+    _, patch = get_gt_model_patch(gt, 20, previous)
+
+    packed = {
+        i
+        for i, trace in enumerate(figure["data"][:-1])
+        if int(trace["name"].split()[1]) < 10
+    }
+    assert patched_traces(patch) == packed
+
+
+def test_slider_patch_without_changes(gt):
+    previous, _ = get_gt_model(gt, 20)
+    _, patch = get_gt_model_patch(gt, 20, previous)
+
+    assert patched_traces(patch) == set()
+    assert payload(patch) <= EMPTY_PATCH_BUDGET
+
+
+def test_slider_patch_without_previous_render(gt):
+    _, figure = get_gt_model(gt, 0)
+    _, patch = get_gt_model_patch(gt, 20)
+
+    assert patched_traces(patch) == set(range(len(figure["data"]) - 1))
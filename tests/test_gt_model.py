@@ -0,0 +1,106 @@
+import time
+
+import pandas as pd
+import pytest
+
+from constants import SITE_SNAPSHOT_TTL
+from helpers import site_frames
+from helpers.cache import LRUCache
+from models.gt import GradeTonnage, PreparedGroups
+
+
+def site_frame(commodity):
+    return pd.DataFrame(
+        {
+            "ms_name": [f"{commodity} site"],
+            "ms": [f"https://minmod.isi.edu/resource/{commodity}"],
+            "commodity": [commodity],
+            "top1_deposit_name": ["Porphyry copper"],
+        }
+    )
+
+
+@pytest.fixture
+def frames(monkeypatch):
+    def iter_site_frames(commodities, normalize):
+        for i, commodity in enumerate(commodities):
+            yield i, site_frame(commodity)
+
+    monkeypatch.setattr(site_frames, "iter_site_frames", iter_site_frames)
+
+
+def test_load_df_with_repeated_commodity(frames):
+    df = GradeTonnage(["nickel", "copper", "nickel"]).load_df()
+
+    assert df["commodity"].to_list() == ["copper", "nickel", "nickel"]
+
+
+def test_load_df_order_does_not_depend_on_selection(frames):
+    first = GradeTonnage(["nickel", "copper"]).load_df()
+    second = GradeTonnage(["copper", "nickel"]).load_df()
+
+    assert first["ms"].to_list() == second["ms"].to_list()
+
+
+def test_prepared_groups_rebuild_only_changed_snapshots(monkeypatch):
+    created = {"dysprosium": time.time(), "neodymium": time.time()}
+    monkeypatch.setattr(site_frames, "snapshot_created", created.get)
+    groups = PreparedGroups({"REE": ["neodymium", "dysprosium"]}, 60)
+    monkeypatch.setattr(groups, "build", lambda members: object())
+
+    assert groups.refresh() == ["REE"]
+    assert groups.refresh() == []
+
+    created["neodymium"] += 1
+    assert groups.refresh() == ["REE"]
+
+
+def test_prepared_groups_rebuild_stale_snapshots(monkeypatch):
+    created = {"palladium": time.time() - SITE_SNAPSHOT_TTL, "platinum": time.time()}
+    monkeypatch.setattr(site_frames, "snapshot_created", created.get)
+    groups = PreparedGroups({"PGE": ["platinum", "palladium"]}, 60)
+    monkeypatch.setattr(groups, "build", lambda members: object())
+
+    assert groups.refresh() == ["PGE"]
+    assert groups.refresh() == ["PGE"]
+
+
+def test_prepared_groups_without_snapshots_reuse_local_frames(monkeypatch):
+    monkeypatch.setattr(site_frames, "snapshot_created", lambda commodity: None)
+    monkeypatch.setattr(site_frames, "frames", LRUCache(2**20, 60))
+    groups = PreparedGroups({"PGE": ["platinum", "palladium"]}, 60)
+
+    def build(members):
+        for member in members:
+            if site_frames.frames.get(member) is None:
+                site_frames.frames.put(member, site_frame(member))
+        return object()
+
+    monkeypatch.setattr(groups, "build", build)
+
+    assert groups.refresh() == ["PGE"]
+    assert groups.refresh() == []
+    assert site_frames.frames.get("platinum") is not None
+
+    site_frames.frames.put("platinum", site_frame("platinum").assign(ms_name="new"))
+    assert groups.refresh() == ["PGE"]
+
+
+def test_prepared_groups_back_off_after_failures(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    monkeypatch.setattr(site_frames, "snapshot_created", lambda commodity: now[0])
+    groups = PreparedGroups({"REE": ["neodymium", "dysprosium"]}, 60)
+    builds = []
+
+    def build(members):
+        builds.append(now[0])
+        raise ValueError("no sites")
+
+    monkeypatch.setattr(groups, "build", build)
+
+    for _ in range(8):
+        groups.refresh()
+        now[0] += 60
+
+    assert [built - 1000 for built in builds] == [0, 120, 360]
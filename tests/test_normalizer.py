@@ -0,0 +1,46 @@
+from helpers.normalizer import normalize_sites
+
+DATA_CACHE = {
+    "countries": {},
+    "states-or-provinces": {},
+    "deposit-types": {
+        "D1": {"name": "Porphyry copper", "group": "Porphyry", "environment": "Arc"}
+    },
+}
+
+
+def site(site_id, deposit_id, grade_tonnage):
+    return {
+        "id": site_id,
+        "name": f"Site {site_id}",
+        "type": "Prospect",
+        "rank": "B",
+        "deposit_types": [
+            {"id": deposit_id, "confidence": 0.9, "source": "algorithm predictions"}
+        ],
+        "grade_tonnage": grade_tonnage,
+    }
+
+
+def test_sites_without_grade_tonnage_are_dropped():
+    gt = {
+        "commodity": "Q589",
+        "total_grade": 0.5,
+        "total_tonnage": 10.0,
+        "total_contained_metal": 0.05,
+    }
+    df = normalize_sites(
+        [
+            site("known", "D1", [gt]),
+            site("unknown-type", "D2", []),
+            site("no-gt", "D1", []),
+        ],
+        DATA_CACHE,
+    )
+
+    assert df["ms_name"].to_list() == ["Site known"]
+    assert df["top1_deposit_name"].to_list() == ["Porphyry copper"]
+
+
+def test_no_site_left():
+    assert normalize_sites([site("unknown-type", "D2", [])], DATA_CACHE).empty
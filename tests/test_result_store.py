@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from helpers import cache, result_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, "RESULT_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(result_store, "results", cache.LRUCache(2**20, 60))
+    monkeypatch.setattr(result_store, "_last_sweep", 0.0)
+    return tmp_path
+
+
+def test_shared_result_is_written_once(store):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return ["https://minmod.isi.edu/resource/site"]
+
+    first = result_store.put_shared(("uris", "v1"), build)
+    result_store.results.invalidate(first)
+    second = result_store.put_shared(("uris", "v1"), build)
+
+    assert first == second
+    assert len(builds) == 1
+    assert result_store.get(first) == ["https://minmod.isi.edu/resource/site"]
+    assert result_store.put_shared(("uris", "v2"), build) != first
+
+
+def test_renders_do_not_remove_shared_results(store):
+    shared = result_store.put_shared(("uris", "v1"), ["uri"])
+    key = result_store.put({"frames": [], "uris": shared})
+    result_store.put({"frames": [], "uris": shared}, replaces=key)
+
+    assert os.path.exists(result_store._path(shared))
+    assert not os.path.exists(result_store._path(key))
+
+
+def test_sweep_is_throttled(store, monkeypatch):
+    sweeps = []
+    monkeypatch.setattr(result_store, "_sweep", lambda: sweeps.append(1))
+
+    result_store.put("a")
+    result_store.put("b")
+
+    assert len(sweeps) == 1
@@ -0,0 +1,65 @@
+from functools import partial
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers import normalizer, reference_data, site_sync, snapshot_store
+from helpers.json_stream import DIGEST_KEY
+
+FRAME = "sites-nickel"
+
+
+def normalize(sites):
+    return pd.DataFrame(
+        {
+            "ms": [normalizer.MS_URI_PREFIX + site["id"] for site in sites],
+            "ms_name": [site["name"] for site in sites],
+        }
+    )
+
+
+def site(site_id, name, digest):
+    return {"id": site_id, "name": name, DIGEST_KEY: digest}
+
+
+@pytest.fixture
+def sync(tmp_path, monkeypatch):
+    for name in ("read_header", "read_frame", "write_frame"):
+        function = getattr(snapshot_store, name)
+        monkeypatch.setattr(snapshot_store, name, partial(function, directory=tmp_path))
+    monkeypatch.setattr(reference_data, "tables", dict)
+    monkeypatch.setattr(reference_data, "registry", SimpleNamespace(version=1))
+    monkeypatch.setattr(site_sync, "DEDUP_MODIFIED_SINCE_PARAM", "modified_since")
+
+    def run(sites):
+        sync = site_sync.SiteSync("nickel", FRAME, normalize, "v1")
+        snapshot_store.write_frame(FRAME, sync.apply(sites))
+        sync.save(snapshot_store.read_header(FRAME)["created"])
+        return sync
+
+    return run
+
+
+def test_incremental_sync_adding_a_site(sync):
+    sync([site("a", "A", 2**64 - 3), site("b", "B", 2**63 + 12345)])
+
+    incremental = sync([site("c", "C", 2**64 - 5), site("a", "A2", 2**63 + 1)])
+
+    assert incremental.incremental
+    ids, digests, _ = incremental.state
+    assert ids.to_list() == ["a", "b", "c"]
+    assert digests.dtype == np.uint64
+    assert digests.tolist() == [2**63 + 1, 2**63 + 12345, 2**64 - 5]
+    df, _ = snapshot_store.read_frame(FRAME)
+    assert df["ms_name"].to_list() == ["A2", "B", "C"]
+
+
+def test_unchanged_digests_after_incremental_sync(sync):
+    sync([site("a", "A", 2**64 - 3), site("b", "B", 2**63 + 12345)])
+    sync([site("c", "C", 2**64 - 5)])
+
+    state, _ = snapshot_store.read_frame(site_sync.state_name("nickel"))
+
+    assert state["digest"].tolist() == [2**64 - 3, 2**63 + 12345, 2**64 - 5]
@@ -0,0 +1,36 @@
+import errno
+
+import numpy as np
+import pandas as pd
+
+from helpers import snapshot_store
+
+
+def test_load_or_build_serves_unwritable_snapshot(tmp_path, monkeypatch):
+    def write_frame(*args, **kwargs):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(snapshot_store, "write_frame", write_frame)
+    df = pd.DataFrame({"id": ["a", "b"]})
+
+    built = snapshot_store.load_or_build("reference", 60, lambda: df, tmp_path)
+
+    assert built is df
+    assert snapshot_store.read_frame("reference", tmp_path) is None
+
+
+def test_categorical_codes_stay_in_the_mapping(tmp_path):
+    df = pd.DataFrame(
+        {
+            "country": pd.Categorical(["Canada", None, "Chile", "Canada"]),
+            "lat": [45.0, 0.0, -33.4, 49.2],
+        }
+    )
+    snapshot_store.write_frame("sites", df, directory=tmp_path)
+
+    mapped, _ = snapshot_store.read_frame("sites", tmp_path)
+
+    pd.testing.assert_frame_equal(mapped, df)
+    codes = mapped["country"].array.codes
+    assert not codes.flags.writeable
+    assert isinstance(codes.base.base, np.memmap)